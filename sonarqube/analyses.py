@@ -1,6 +1,15 @@
-from datetime import date
+import argparse
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from sonar_qube_api import *
+from issue_table import IssueTable
+from instrumentation import metrics
+from issue_mirror import IssueMirror
+from crawl_checkpoint import CrawlCheckpoint
+from report_output import OUTPUT_FORMATS, XlsxOutput
 
 """
     Map of project versions to analyze. 
@@ -127,44 +136,184 @@ PROJECTS = {
     ],
 }
 
+"""
+    SonarQube measures that are also stored with the technical debt of each project analysis
+"""
+PROJECT_MEASURES_LIST = [
+    "ncloc",
+    "classes",
+    "statements",
+    "functions",
+    "development_cost",
+    "sqale_debt_ratio",
+    "sqale_index",
+]
+
+# File measures of each project version, used for both file LOC and package technical debt
+FILE_MEASURES_LIST = ["sqale_index", "ncloc"]
+
 """
     Utility functions
 """
 
 
-def _group_issues_by_project_analysis(issues, project_analyses):
+def _index_measure_history(measures):
     """
-    Assign issues to project analyses. An issue is assigned to an analysis if it was OPEN at the time of analysis
-    (includes issued CREATED during the analysis) or it was CLOSED during that analysis.
-    params:
-        issues - List of issues in JSON dictionary format
-        project_analyses - List of project analyses (software versions)
-    return:
-        Dictionary of (<project analysis>,[<issue_1>,<issue_2>,...,<issue_k>]) entries
+    Index the measures from an @api_measures_search_history call by metric and date
+    output:
+        Dictionary of ((<metric>, <date>), <value>) entries. If a metric has several values on a date, the last one
+        in the history is kept
     """
-    # Assign issues to project versions, depending on issue status
-    # keys are tuples: (<project_name>,<project_version>,<analysis_date>)
-    # values are issues represented as JSON dictionaries
-    analyses_issues_dict = {}
-    MAX_DATE = date(9999, 12, 31)
+    measure_index = {}
+    for metric in measures["measures"]:
+        for date_value in metric["history"]:
+            if "value" in date_value:
+                measure_index[
+                    (metric["metric"], sq_datetime_to_date(date_value["date"]))
+                ] = date_value["value"]
+    return measure_index
 
-    for analysis in project_analyses:
-        # Initialize an empty list for issues
-        analyses_issues_dict[analysis] = []
 
-    for issue in issues:
-        for analysis in project_analyses:
-            # If issue not for current project we don't care
-            if issue.project != analysis.project:
-                continue
-            # Issue had status OPEN, or was CLOSED during this analysis
-            if (
-                issue.creationDate
-                <= analysis.date
-                <= (issue.closeDate if issue.closeDate != None else MAX_DATE)
-            ):
-                analyses_issues_dict[analysis].append(issue)
-    return analyses_issues_dict
+class ReportDataset:
+    """
+    SonarQube data shared by the reports. Each part is fetched on first use and reused by every report run
+    against the dataset, so running all reports crawls the servers once:
+        catalog                          - projects and analyses
+        @issues, @issue_table            - all Java issues (live or from an IssueMirror)
+        @measure_history                 - PROJECT_MEASURES_LIST history of a project
+        @file_measures                   - FILE_MEASURES_LIST of all files of a project version
+    """
+
+    def __init__(self, catalog=None, mirror=None, max_concurrency=1, checkpoint=None):
+        """
+        params:
+            catalog         - ProjectCatalog to reuse (projects and analyses are fetched if None)
+            mirror          - Synced IssueMirror (for the same filters) to read issues from, instead of the live server
+            max_concurrency - Maximum number of API calls in flight
+            checkpoint      - CrawlCheckpoint of the live issue crawl, to resume a crawl that failed halfway
+        """
+        if catalog is None:
+            catalog = ProjectCatalog()
+        self.catalog = catalog
+        self.mirror = mirror
+        self.max_concurrency = max_concurrency
+        self.checkpoint = checkpoint
+        self._issues = None
+        self._issue_table = None
+        self._measure_history = {}
+        self._file_measures = {}
+        # File measures are fetched from the LOC prefetch threads
+        self._lock = threading.Lock()
+
+    def issues(self):
+        """
+        All recorded Java issues
+        Must circumvent SonarQube's 10k issue limitation
+        """
+        if self._issues is None:
+            with metrics.stage("dataset.issues"):
+                if self.mirror is not None:
+                    self._issues = self.mirror.issues(self.catalog)
+                else:
+                    self._issues = api_issues_search(
+                        ["java"],
+                        resolutions=[],
+                        types=["CODE_SMELL", "BUG", "VULNERABILITY"],
+                        catalog=self.catalog,
+                        max_concurrency=self.max_concurrency,
+                        checkpoint=self.checkpoint,
+                    )
+            print("Total issues returned - " + str(len(self._issues)))
+        return self._issues
+
+    def issue_table(self):
+        """
+        Columnar IssueTable of @issues
+        """
+        if self._issue_table is None:
+            issues = self.issues()
+            with metrics.stage("dataset.issue_table"):
+                self._issue_table = IssueTable.from_issues(issues)
+        return self._issue_table
+
+    def measure_history(self, project):
+        """
+        Result of @api_measures_search_history for PROJECT_MEASURES_LIST
+        """
+        if project not in self._measure_history:
+            with metrics.stage("dataset.measure_history"):
+                self._measure_history[project] = api_measures_search_history(
+                    project, PROJECT_MEASURES_LIST
+                )
+        return self._measure_history[project]
+
+    def file_measures(self, component, bulk=True, max_concurrency=1):
+        """
+        Result of @_fetch_file_measures for a project version (e.g. "jEdit.4.3")
+        """
+        with self._lock:
+            if component in self._file_measures:
+                return self._file_measures[component]
+        # Stage time adds up the time of the LOC prefetch threads
+        with metrics.stage("dataset.file_measures"):
+            file_measures = _fetch_file_measures(component, bulk, max_concurrency)
+        with self._lock:
+            self._file_measures[component] = file_measures
+        return file_measures
+
+    def fetched_file_measures(self, component):
+        """
+        @file_measures of a project version if already fetched, None otherwise (nothing is fetched)
+        """
+        with self._lock:
+            return self._file_measures.get(component)
+
+    def add_file_measures(self, component, file_measures):
+        """
+        Record file measures of a project version fetched elsewhere (e.g. in a report worker process)
+        """
+        with self._lock:
+            self._file_measures.setdefault(component, file_measures)
+
+
+# Issue table of a report worker process
+_worker_issue_table = None
+
+
+def _init_report_worker(cache, issue_table, jobs, settings=None, projects=None):
+    global _worker_issue_table, PROJECTS
+    set_response_cache(cache)
+    _worker_issue_table = issue_table
+    # Spawned workers import the modules with their defaults
+    if settings is not None:
+        apply_process_settings(settings)
+        PROJECTS = projects
+    # All workers call the same servers, together they stay within the concurrency limits of one process
+    share_concurrency_limits(jobs)
+    # Forked workers start with a copy of the parent metrics, jobs only return what they record
+    metrics.reset()
+
+
+def _report_process_pool(jobs, issue_table=None):
+    """
+    Process pool for report jobs, None if jobs <= 1
+    Workers use the same response cache and settings, shared clients are rebuilt in each worker
+    (see sonar_qube_api.process_settings)
+    params:
+        jobs        - Number of worker processes
+        issue_table - IssueTable handed once to each worker
+    """
+    if jobs <= 1:
+        return None
+    initargs = (get_response_cache(), issue_table, jobs)
+    # Forked workers inherit the settings and PROJECTS
+    if multiprocessing.get_start_method() != "fork":
+        initargs += (process_settings(), PROJECTS)
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_report_worker,
+        initargs=initargs,
+    )
 
 
 """
@@ -174,72 +323,34 @@ def _group_issues_by_project_analysis(issues, project_analyses):
 
 def export_technical_debt_measures_to_xlsx(
     xlsx_output="./technical_debt_by_software_version.xlsx",
+    catalog=None,
+    mirror=None,
+    constant_memory=False,
+    output=None,
+    dataset=None,
 ):
     # 1. Get project analyses
-    project_names = api_projects_search()
+    if dataset is None:
+        dataset = ReportDataset(catalog, mirror)
+    catalog = dataset.catalog
+    project_names = catalog.projects()
     project_analyses = []
-
-    # SonarQube measures that are also stored
-    PROJECT_MEASURES_LIST = [
-        "ncloc",
-        "classes",
-        "statements",
-        "functions",
-        "development_cost",
-        "sqale_debt_ratio",
-        "sqale_index",
-    ]
-    project_measure_history = {}
-
     for project in project_names:
-        project_analyses.extend(api_project_analyses(project))
-        project_measure_history[project] = api_measures_search_history(
-            project, PROJECT_MEASURES_LIST
-        )
+        project_analyses.extend(catalog.analyses(project))
 
     # Sort project analyses by date
     project_analyses.sort(key=lambda x: x.date)
 
-    # 2. Get all recorded issues
-    # Must circumvent SonarQube's 10k issue limitation
-    issues = api_issues_search(["java"], resolutions=[], types=["CODE_SMELL"])
-    issues.extend(api_issues_search(["java"], resolutions=[], types=["BUG"]))
-    issues.extend(api_issues_search(["java"], resolutions=[], types=["VULNERABILITY"]))
-    print("Total issues returned - " + str(len(issues)))
-
-    # 3. Assign issues to project versions, depending on issue status
-    analyses_issues_dict = _group_issues_by_project_analysis(issues, project_analyses)
-
-    # Group technical debt by analysis here
+    # 2. Group technical debt by analysis here
+    # Issues are assigned to project versions depending on issue status
+    issue_table = dataset.issue_table()
     analyses_technical_debt = {}
+    with metrics.stage("technical-debt.aggregate"):
+        for analysis in project_analyses:
+            # (<new debt>, <existing debt>, <fixed debt>) tuple
+            analyses_technical_debt[analysis] = issue_table.technical_debt(analysis)
 
-    MAX_DATE = date(9999, 12, 31)
-    # Dictionary of (<project analysis>,[<issue_1>,<issue_2>,...,<issue_k>]) entries
-    for analysis in analyses_issues_dict:
-        # This is the list of issues for the given analysis
-        analysis_issues = analyses_issues_dict[analysis]
-
-        # <total technical debt> = <new debt> + <existing debt>
-        # <fixed technical debt> = issues marked as 'FIXED'
-        new_debt = 0
-        existing_debt = 0
-        fixed_debt = 0
-
-        for issue in analysis_issues:
-            issue_close_date = issue.closeDate if issue.closeDate != None else MAX_DATE
-            issue_debt = issue.debt if issue.debt != "n/a" else 0
-
-            assert issue.creationDate != issue.closeDate
-            if analysis.date == issue.creationDate:
-                new_debt += issue_debt
-            elif analysis.date == issue_close_date:
-                fixed_debt += issue_debt
-            else:
-                existing_debt += issue_debt
-
-        analyses_technical_debt[analysis] = (new_debt, existing_debt, fixed_debt)
-
-    # 4. Export issues. One sheet per project
+    # 3. Export issues. One sheet per project
     header = [
         "Date",
         "Version",
@@ -247,134 +358,194 @@ def export_technical_debt_measures_to_xlsx(
         "Existing Debt",
         "Fixed Debt",
     ] + PROJECT_MEASURES_LIST
-    book = xlsxwriter.Workbook(xlsx_output)
+    # XLSX output by default, the report is named after the XLSX file
+    if output is None:
+        output = XlsxOutput(constant_memory=constant_memory)
+    report = output.open(os.path.splitext(xlsx_output)[0])
 
     for project_name in project_names:
         # Create sheet, write header
-        out_sheet = book.add_worksheet(project_name)
-        for column in range(len(header)):
-            out_sheet.set_column(column, column, 12)
-            out_sheet.write(0, column, header[column])
-        # Project measures
-        project_measures = project_measure_history[project_name]
+        out_sheet = report.table(
+            "technical_debt",
+            header,
+            sheet=project_name,
+            partition={"project": project_name},
+            column_widths={column: 12 for column in range(len(header))},
+        )
+        # Project measures, indexed by (<metric>, <date>)
+        project_measures = _index_measure_history(dataset.measure_history(project_name))
 
         row = 1
         for project_analysis in project_analyses:
             if project_analysis.project != project_name:
                 continue
-            out_sheet.write(row, 0, str(project_analysis.date))
-            out_sheet.write(row, 1, project_analysis.version)
             debt_info_tuple = analyses_technical_debt[project_analysis]
-            out_sheet.write(row, 2, debt_info_tuple[0])
-            out_sheet.write(row, 3, debt_info_tuple[1])
-            out_sheet.write(row, 4, debt_info_tuple[2])
-
-            # Write recorded project measures
-            for index in range(len(PROJECT_MEASURES_LIST)):
-                project_measure = PROJECT_MEASURES_LIST[index]
-                for metric in project_measures["measures"]:
-                    if metric["metric"] == project_measure:
-                        for date_value in metric["history"]:
-                            if (
-                                sq_datetime_to_date(date_value["date"])
-                                == project_analysis.date
-                            ):
-                                # Once we get the metric and the date right
-                                out_sheet.write(row, 5 + index, date_value["value"])
-            row += 1
-    book.close()
-
-
-def calculate_package_technical_debt_history():
+            values = [
+                str(project_analysis.date),
+                project_analysis.version,
+                debt_info_tuple[0],
+                debt_info_tuple[1],
+                debt_info_tuple[2],
+            ]
+
+            # Recorded project measures, None leaves the cell empty
+            for project_measure in PROJECT_MEASURES_LIST:
+                values.append(
+                    project_measures.get((project_measure, project_analysis.date))
+                )
+            out_sheet.write_row(values)
+    report.close()
+
+
+def _fetch_file_measures(component, bulk=True, max_concurrency=1):
+    """
+    FILE_MEASURES_LIST measures of all files of a project version
+    params:
+        component       - Project version key (e.g. "jEdit.4.3")
+        bulk            - Fetch file measures a page of 500 files at a time, otherwise one call per file
+        max_concurrency - Maximum number of per-file calls in flight
+    output:
+        Dictionary of (<file key>, {<metric key>: <value>}) entries
+    """
+    if bulk:
+        # All file measures of this version, a few pages of 500 files each
+        return api_measures_component_tree(component, FILE_MEASURES_LIST)
+    # Fetch stage: measures of all files of this version, fetched concurrently
+    return api_measures_components(
+        api_cu_names(component), FILE_MEASURES_LIST, max_concurrency
+    )
+
+
+def _package_td_loc(project_version, file_measures):
+    """
+    Technical debt and LOC of the packages of one application version
+    params:
+        file_measures - Result of @_fetch_file_measures for the version
+    output:
+        Dictionary of (<package name>, [<TD>, <LOC>]) entries
+    """
+    package_td_loc_dict = {}
+    print(str(project_version) + " - " + str(len(file_measures)))
+
+    for fil_name in file_measures:
+        measures = file_measures[fil_name]
+        # Files without both sqale_index and ncloc are skipped
+        if "sqale_index" not in measures or "ncloc" not in measures:
+            continue
+        tech_debt = int(measures["sqale_index"])
+        ncloc = int(measures["ncloc"])
+
+        package_name = fil_name[fil_name.find(":src/") + 5 : fil_name.rfind("/")]
+        if not (package_name in package_td_loc_dict):
+            # First item is TD, second is ncloc
+            package_td_loc_dict[package_name] = [0, 0]
+        package_td_loc_dict[package_name][0] += tech_debt
+        package_td_loc_dict[package_name][1] += ncloc
+    return package_td_loc_dict
+
+
+def _package_td_loc_job(app, project_version, bulk, max_concurrency):
+    """
+    Process pool job: fetch the file measures of an application version and sum them by package
+    output:
+        (<package TD and LOC>, <drained worker metrics>) tuple
+    """
+    package_td_loc_dict = _package_td_loc(
+        project_version,
+        _fetch_file_measures(app + "." + project_version, bulk, max_concurrency),
+    )
+    return package_td_loc_dict, metrics.drain()
+
+
+def calculate_package_technical_debt_history(
+    constant_memory=False,
+    output=None,
+    jobs=1,
+    bulk=True,
+    max_concurrency=1,
+    dataset=None,
+):
+    """
+    params:
+        constant_memory - Flush each XLSX row to disk once written
+        output          - Output backend from report_output (XLSX if None)
+        jobs            - Number of processes the versions of all applications are spread across
+        bulk            - Fetch file measures with /api/measures/component_tree, otherwise one call per file
+        max_concurrency - Maximum number of per-file calls in flight (in each process)
+        dataset         - ReportDataset shared with other reports, file measures fetched by the detailed report
+                          are reused
+    """
+    if dataset is None:
+        dataset = ReportDataset()
+    if output is None:
+        output = XlsxOutput(constant_memory=constant_memory)
+
+    # Versions are processed in the pool in any order, results are merged in application/version order
+    # Versions whose file measures are already in the dataset (e.g. fetched by the detailed report) are not
+    # fetched again
+    executor = _report_process_pool(jobs)
+    if executor is not None:
+        package_futures = {}
+        for app in PROJECTS:
+            for project_version in PROJECTS[app]:
+                if dataset.fetched_file_measures(app + "." + project_version) is None:
+                    package_futures[(app, project_version)] = executor.submit(
+                        _package_td_loc_job, app, project_version, bulk, max_concurrency
+                    )
+
     for app in PROJECTS:
-        book = xlsxwriter.Workbook("Package_TechnicalDebt_History_" + app + ".xlsx")
-        header_cell_format = book.add_format(
-            {"bold": True, "center_across": True, "bg_color": "#FFFFCC"}
-        )
+        report = output.open("Package_TechnicalDebt_History", {"project": app})
+        # Overall sheet has a row per package and a column per version
+        ver_list = sorted(set(PROJECTS[app]))
 
         # Centralizer sheet for maintainability model correlations
-        overall_sheet = book.add_worksheet("Package TD History")
-        cell_format = book.add_format()
-        cell_format.set_num_format("0.00")
+        # Only spreadsheets get the history sheets, the package_td tables hold the same data in long form
+        if output.spreadsheet:
+            overall_sheet = report.table(
+                "package_td_history",
+                ["Package"] + ver_list,
+                sheet="Package TD History",
+            )
 
         # Dictionary of application versions (key) and associated dict of package TD (value)
         ver_package_td_loc_dict = {}
         # Total TD for a package (across application versions)
         total_package_td_loc_dict = {}
 
-        logger.debug("Application: " + app)
+        logger.debug("Application: %s", app)
         for project_version in PROJECTS[app]:
-            ver_sheet = book.add_worksheet(project_version)
-            package_td_loc_dict = {}
-
-            fil_names = api_cu_names(app + "." + project_version)
-            print(str(project_version) + " - " + str(len(fil_names)))
-
-            for fil_name in fil_names:
-                tech_debt = "n/a"
-                ncloc = 0
-                component_measure = api_measures_component(
-                    fil_name, ["sqale_index", "ncloc"]
+            if executor is not None and (app, project_version) in package_futures:
+                with metrics.stage("package-history.wait"):
+                    package_td_loc_dict, worker_metrics = package_futures.pop(
+                        (app, project_version)
+                    ).result()
+                metrics.merge(worker_metrics)
+            else:
+                file_measures = dataset.file_measures(
+                    app + "." + project_version, bulk, max_concurrency
                 )
-
-                if "component" in component_measure:
-                    assert (
-                        len(component_measure["component"]["measures"]) == 2
-                    ), "Returns sqale_index, ncloc"
-
-                    v0 = component_measure["component"]["measures"][0]
-                    v1 = component_measure["component"]["measures"][1]
-
-                    # Sanity checks
-                    assert v0["metric"] in [
-                        "ncloc",
-                        "sqale_index",
-                    ], "Must be one of these measurements"
-                    assert v1["metric"] in [
-                        "ncloc",
-                        "sqale_index",
-                    ], "Must be one of these measurements"
-                    assert v0["metric"] != v1["metric"]
-
-                    if v0["metric"] == "ncloc":
-                        ncloc = int(v0["value"])
-                        tech_debt = int(v1["value"])
-                    else:
-                        ncloc = int(v1["value"])
-                        tech_debt = int(v0["value"])
-
-                if tech_debt == "n/a":
-                    continue
-
-                package_name = fil_name[
-                    fil_name.find(":src/") + 5 : fil_name.rfind("/")
-                ]
-                if not (package_name in package_td_loc_dict):
-                    # First item is TD, second is ncloc
-                    package_td_loc_dict[package_name] = [0, 0]
-                package_td_loc_dict[package_name][0] += tech_debt
-                package_td_loc_dict[package_name][1] += ncloc
+                with metrics.stage("package-history.aggregate"):
+                    package_td_loc_dict = _package_td_loc(
+                        project_version, file_measures
+                    )
 
             # Write to current version sheet
-            COLUMN_WIDTHS = [60, 10, 10]
-            COLUMN_HEADERS = ["Package", "TD", "LOC"]
-            for column in range(len(COLUMN_WIDTHS)):
-                ver_sheet.set_column(column, column, COLUMN_WIDTHS[column])
-                ver_sheet.write(0, column, COLUMN_HEADERS[column], header_cell_format)
+            ver_sheet = report.table(
+                "package_td",
+                ["Package", "TD", "LOC"],
+                sheet=project_version,
+                partition={"version": project_version},
+                header_style=True,
+                column_widths={0: 60, 1: 10, 2: 10},
+            )
 
             sorted_package_td_loc_dict = sorted(
                 package_td_loc_dict.items(), key=lambda kv: kv[1][0], reverse=True
             )
 
-            row = 1
             for package in sorted_package_td_loc_dict:
-                # Package name
-                ver_sheet.write(row, 0, package[0])
-                # Package TD
-                ver_sheet.write(row, 1, package[1][0])
-                # PAckage LOC
-                ver_sheet.write(row, 2, package[1][1])
-                row += 1
+                # Package name, TD and LOC
+                ver_sheet.write_row([package[0], package[1][0], package[1][1]])
 
             # Record this version's package TD and LOC for overall sheet
             ver_package_td_loc_dict[project_version] = package_td_loc_dict
@@ -388,6 +559,10 @@ def calculate_package_technical_debt_history():
                 total_package_td_loc_dict[package][1] += package_td_loc_dict[package][
                     1
                 ]  # LOC
+        if not output.spreadsheet:
+            report.close()
+            continue
+
         # Sort the total package TD before filling in the overall sheet
         sorted_total_package_td_loc_dict = sorted(
             total_package_td_loc_dict.items(), key=lambda kv: kv[1][0], reverse=True
@@ -396,433 +571,730 @@ def calculate_package_technical_debt_history():
         #
         # Fill in overall package TD
         #
-        overall_sheet.write(0, 0, "Package")
-        # Write package names sorted descending by total TD on first column
-        row = 1
+        # Package names sorted descending by total TD on first column
         for package_td_tuple in sorted_total_package_td_loc_dict:
-            overall_sheet.write(row, 0, package_td_tuple[0])
-            row += 1
-        # One version on each subsequent column
-        row = 1
-        col = 1
-        ver_list = sorted(list(ver_package_td_loc_dict.keys()))
-
-        for ver in ver_list:
-            overall_sheet.write(0, col, ver)
-            for package_tuple in sorted_total_package_td_loc_dict:
+            values = [package_td_tuple[0]]
+            for ver in ver_list:
                 # Not all packages appear in all application versions
-                if package_tuple[0] not in ver_package_td_loc_dict[ver].keys():
-                    # overall_sheet.write(row, col, 0)
-                    pass
+                package_td_loc = ver_package_td_loc_dict[ver].get(package_td_tuple[0])
+                # Only write TD for those app version/package combos that contain source code
+                if package_td_loc is not None and package_td_loc[1] > 0:
+                    values.append(package_td_loc[0])
                 else:
-                    # Only write TD for those app version/package combos that contain source code
-                    if ver_package_td_loc_dict[ver][package_tuple[0]][1] > 0:
-                        overall_sheet.write(
-                            row, col, ver_package_td_loc_dict[ver][package_tuple[0]][0]
-                        )
-                row += 1
-            row = 1
-            col += 1
+                    values.append(None)
+            overall_sheet.write_row(values)
 
         #
-        # Fill in overall package LOC
+        # Fill in overall package LOC, below the package TD on the same sheet
         #
-        start_row = len(sorted_total_package_td_loc_dict) + 5
-        row = start_row
-        # Write package names sorted descending by total TD on first column
+        overall_loc_sheet = report.table(
+            "package_loc_history",
+            ["Package"] + ver_list,
+            sheet="Package TD History",
+            sheet_header=[None] + ver_list,
+            skip_rows=3,
+        )
         for package_td_tuple in sorted_total_package_td_loc_dict:
-            overall_sheet.write(row, 0, package_td_tuple[0])
-            row += 1
-        # One version on each subsequent column
-        row = start_row
-        col = 1
-        ver_list = sorted(list(ver_package_td_loc_dict.keys()))
-
-        for ver in ver_list:
-            overall_sheet.write(row - 1, col, ver)
-            for package_tuple in sorted_total_package_td_loc_dict:
+            values = [package_td_tuple[0]]
+            for ver in ver_list:
                 # Not all packages appear in all application versions
-                if package_tuple[0] not in ver_package_td_loc_dict[ver].keys():
-                    # overall_sheet.write(row, col, 0)
-                    pass
+                package_td_loc = ver_package_td_loc_dict[ver].get(package_td_tuple[0])
+                if package_td_loc is not None and package_td_loc[1] != 0:
+                    values.append(package_td_loc[1])
                 else:
-                    val = ver_package_td_loc_dict[ver][package_tuple[0]][1]
-                    if val != 0:
-                        overall_sheet.write(row, col, val)
-                row += 1
-            row = start_row
-            col += 1
+                    values.append(None)
+            overall_loc_sheet.write_row(values)
 
-        book.close()
+        report.close()
+    if executor is not None:
+        executor.shutdown()
 
 
-def export_detailed_td_characterization_by_software_version_xlsx():
-    # 1. Get project analyses
-    project_analyses = {}
-    for project in api_projects_search():
-        project_analyses[project] = api_project_analyses(project)
-        # Sort project analyses by date
-        project_analyses[project].sort(key=lambda x: x.date)
-
-    # 2. Get all recorded Java issues
-    # Must circumvent SonarQube's 10k issue limitation
-    issues = api_issues_search(["java"], resolutions=[], types=["CODE_SMELL"])
-    issues.extend(api_issues_search(["java"], resolutions=[], types=["BUG"]))
-    issues.extend(api_issues_search(["java"], resolutions=[], types=["VULNERABILITY"]))
-    print("Total issues returned - " + str(len(issues)))
-
-    # 3. Assign issues to project versions, depending on issue status
-    # Dictionary of (<project analysis>,[<issue_1>,<issue_2>,...,<issue_k>]) entries
-    all_analyses = []
-    for value in project_analyses.values():
-        all_analyses.extend(value)
-    analyses_issues_dict = _group_issues_by_project_analysis(issues, all_analyses)
+def _version_td_characterization(issue_table, analysis):
+    """
+    Technical debt of the issues OPEN at the time of analysis, we don't care about FIXED issues
+    output:
+        (<debt by tag>, <debt by rule>, <debt by file, severity and type>) tuple of dictionaries
+    """
+    analysis_mask = issue_table.analysis_mask(analysis, include_fixed=False)
+    return (
+        issue_table.debt_by_tag(analysis_mask),
+        issue_table.debt_by_rule(analysis_mask),
+        issue_table.debt_by_component(analysis_mask),
+    )
 
-    # 4. Export issues grouped by file. One XSLX per project, one sheet per software version
-    for project_name in project_analyses:
-        logger.debug(
-            "Aggregate technical debt at file level in each software version for project - "
-            + project_name
+
+def _version_td_characterization_job(analysis, fetch_loc=True):
+    """
+    Process pool job: @_version_td_characterization on the worker's issue table, plus the LOC of every file
+    (None if not fetch_loc) and the drained worker metrics
+    """
+    tag_debt, rule_debt, component_td = _version_td_characterization(
+        _worker_issue_table, analysis
+    )
+    version_loc = None
+    if fetch_loc:
+        version_loc = _fetch_file_measures(analysis.project + "." + analysis.version)
+    return tag_debt, rule_debt, component_td, version_loc, metrics.drain()
+
+
+"""
+    Columns of the version_summary table: technical debt by file quintile, by severity and by type
+"""
+VERSION_SUMMARY_COLUMNS = [
+    "q1",
+    "q2",
+    "q3",
+    "q4",
+    "q5",
+    "blocker",
+    "critical",
+    "major",
+    "minor",
+    "info",
+    "bug",
+    "vulnerability",
+    "code_smell",
+]
+
+
+def _write_overall_sheet(
+    overall_sheet,
+    project_analyses,
+    version_summaries,
+    version_rows,
+    tag_debts,
+    rule_debts,
+    rule_quintiles,
+    tag_list,
+    rule_list,
+):
+    """
+    Write the overall sheet of the detailed report, a column per version
+    params:
+        project_analyses  - Project analyses, one column each
+        version_summaries - Dictionary of (<project analysis>, {<VERSION_SUMMARY_COLUMNS column>: <debt>}) entries
+        version_rows      - Dictionary of (<project analysis>, <last row of the version sheet>) entries
+        tag_debts         - Dictionary of (<project analysis>, <debt by tag>) entries
+        rule_debts        - Dictionary of (<project analysis>, <debt by rule>) entries
+        rule_quintiles    - Dictionary of (<project analysis>, [<Q1 debt>, .., <Q5 debt>]) entries
+        tag_list          - Tags in row order
+        rule_list         - Rules in row order
+    """
+    # List of overall sheet columns, one per version
+    overall_columns = []
+    for analysis in project_analyses:
+        summary = version_summaries[analysis]
+        # Excel CORREL formula. e.g. '=CORREL('0.1pre'!B2:B10,'0.1pre'!C2:C10)'
+        correl_formula = (
+            "=CORREL('"
+            + analysis.version
+            + "'!B2:B"
+            + str(version_rows[analysis])
+            + ",'"
+            + analysis.version
+            + "'!C2:C"
+            + str(version_rows[analysis])
+            + ")"
         )
-        work_book = xlsxwriter.Workbook(
-            "technical_debt_by_software_version_and_file_" + project_name + ".xlsx"
+        overall_columns.append(
+            [summary["q1"], summary["q2"], summary["q3"], summary["q4"], summary["q5"]]
+            + [correl_formula, None]
+            # Technical debt broken down by severity / type
+            + [
+                summary["blocker"],
+                summary["critical"],
+                summary["major"],
+                summary["minor"],
+                summary["info"],
+                None,
+                summary["bug"],
+                summary["vulnerability"],
+                summary["code_smell"],
+                None,
+            ]
+            # TD for each tag, then each rule (0 if not found in the version)
+            + [int(tag_debts[analysis].get(tag, 0)) for tag in tag_list]
+            + [None]
+            + [int(rule_debts[analysis].get(rule, 0)) for rule in rule_list]
+            + [None]
+            + rule_quintiles[analysis]
         )
-        header_cell_format = work_book.add_format(
-            {"bold": True, "center_across": True, "bg_color": "#FFFFCC"}
+
+    # Row labels of the overall sheet
+    overall_labels = (
+        [
+            "Q1 (file)",
+            "Q2 (file)",
+            "Q3 (file)",
+            "Q4 (file)",
+            "Q5 (file)",
+            "CORREL",
+            None,
+            "BLOCKER",
+            "CRITICAL",
+            "MAJOR",
+            "MINOR",
+            "INFO",
+            None,
+            "BUG",
+            "VULNERABILITY",
+            "CODE SMELL",
+            None,
+        ]
+        + tag_list
+        + [None]
+        + rule_list
+        + [None, "Q1 (rule)", "Q2 (rule)", "Q3 (rule)", "Q4 (rule)", "Q5 (rule)"]
+    )
+    for row in range(len(overall_labels)):
+        # Blank rows separate the sections of the sheet
+        if overall_labels[row] is None:
+            overall_sheet.skip_row()
+            continue
+        overall_sheet.write_row(
+            [overall_labels[row]] + [column[row] for column in overall_columns]
         )
 
-        overall_sheet = work_book.add_worksheet("Overall")
-        overall_sheet_col = 1
-        # List of per-quintile technical debt
-        quintile_info = []
-
-        overall_sheet.write(0, 0, "version")
-        overall_sheet.write(1, 0, "Q1 (file)")
-        overall_sheet.write(2, 0, "Q2 (file)")
-        overall_sheet.write(3, 0, "Q3 (file)")
-        overall_sheet.write(4, 0, "Q4 (file)")
-        overall_sheet.write(5, 0, "Q5 (file)")
-        overall_sheet.write(6, 0, "CORREL")
-
-        overall_sheet.write(8, 0, "BLOCKER")
-        overall_sheet.write(9, 0, "CRITICAL")
-        overall_sheet.write(10, 0, "MAJOR")
-        overall_sheet.write(11, 0, "MINOR")
-        overall_sheet.write(12, 0, "INFO")
-
-        overall_sheet.write(14, 0, "BUG")
-        overall_sheet.write(15, 0, "VULNERABILITY")
-        overall_sheet.write(16, 0, "CODE SMELL")
-
-        # Technical debt in this software version
-        # a. Calculated at tag level
-        software_version_td_tag_level = {}
-        # b. Calculated at rule level
-        software_version_td_rule_level = {}
-
-        for current_analysis in project_analyses[project_name]:
-            # Create an entry for this version in the td dictionary
-            software_version_td_tag_level[current_analysis] = {}
-            software_version_td_rule_level[current_analysis] = {}
-
-            logger.debug("Analyzing - " + current_analysis.version)
-            project_sheet = work_book.add_worksheet(current_analysis.version)
-            project_sheet.set_column(0, 0, 80)
-            project_sheet.set_column(9, 9, 12)
-            project_sheet.set_column(10, 10, 12)
-            project_sheet.write(0, 0, "component", header_cell_format)
-            project_sheet.write(0, 1, "debt", header_cell_format)
-            project_sheet.write(0, 2, "LOC", header_cell_format)
-            project_sheet.write(0, 3, "Blocker", header_cell_format)
-            project_sheet.write(0, 4, "Critical", header_cell_format)
-            project_sheet.write(0, 5, "Major", header_cell_format)
-            project_sheet.write(0, 6, "Minor", header_cell_format)
-            project_sheet.write(0, 7, "Info", header_cell_format)
-            project_sheet.write(0, 8, "Bug", header_cell_format)
-            project_sheet.write(0, 9, "Code Smell", header_cell_format)
-            project_sheet.write(0, 10, "Vulnerability", header_cell_format)
-
-            # Dictionary of file-level technical debt
-            component_td = {}
-            for issue in analyses_issues_dict[current_analysis]:
-                # We don't care about FIXED issues
-                if issue.closeDate == current_analysis.date:
-                    continue
-
-                # Issue debt per component
-                issue_debt = issue.debt if issue.debt != "n/a" else 0
-
-                # Not interested in file-level breakdown
-                # a. Record technical debt by tag at issue level
-                issue_tags = issue.tags.split(",") if len(issue.tags) > 2 else []
-                for tag in issue_tags:
-                    if tag not in software_version_td_tag_level[current_analysis]:
-                        software_version_td_tag_level[current_analysis][tag] = 0
-                    software_version_td_tag_level[current_analysis][
-                        tag
-                    ] += issue_debt / len(issue_tags)
-
-                # b. Record technical debt by rule at issue level
-                if issue.rule not in software_version_td_rule_level[current_analysis]:
-                    software_version_td_rule_level[current_analysis][issue.rule] = 0
-                software_version_td_rule_level[current_analysis][
-                    issue.rule
-                ] += issue_debt
-
-                if issue.component not in component_td:
-                    component_td[issue.component] = {
-                        "TD": 0,
-                        "BUG": 0,
-                        "CODE_SMELL": 0,
-                        "VULNERABILITY": 0,
-                        "BLOCKER": 0,
-                        "CRITICAL": 0,
-                        "MAJOR": 0,
-                        "MINOR": 0,
-                        "INFO": 0,
-                    }
-                component_td[issue.component][str(issue.severity)] += issue_debt
-                component_td[issue.component][str(issue.type)] += issue_debt
-                component_td[issue.component]["TD"] += issue_debt
-
-            # Sort components by technical debt using a list
-            components = []
-            for comp in component_td:
-                components.append((comp, component_td[comp]))
-            components.sort(key=lambda x: x[1]["TD"], reverse=True)
-
-            row = 1
-            for tup in components:
-                # Sanity checks
-                assert (
-                    tup[1]["TD"]
-                    == tup[1]["BUG"] + tup[1]["CODE_SMELL"] + tup[1]["VULNERABILITY"]
+
+def export_detailed_td_characterization_by_software_version_xlsx(
+    catalog=None,
+    mirror=None,
+    max_concurrency=1,
+    constant_memory=False,
+    output=None,
+    jobs=1,
+    dataset=None,
+):
+    """
+    params:
+        catalog         - ProjectCatalog to reuse (projects and analyses are fetched if None)
+        mirror          - Synced IssueMirror to read issues from, instead of the live server
+        max_concurrency - Maximum number of API calls in flight
+        constant_memory - Flush each XLSX row to disk once written
+        output          - Output backend from report_output (XLSX if None)
+        jobs            - Number of processes the versions of all projects are spread across
+        dataset         - ReportDataset shared with other reports (catalog, mirror and max_concurrency are
+                          only used to create one if None)
+    """
+    # 1. Get project analyses (sorted by date)
+    if dataset is None:
+        dataset = ReportDataset(catalog, mirror, max_concurrency)
+    catalog = dataset.catalog
+    project_analyses = {}
+    for project in catalog.projects():
+        project_analyses[project] = catalog.analyses(project)
+
+    # 2. Get all recorded Java issues (fetched once per dataset)
+    # 3. Columnar issue table, issues are assigned to project versions depending on issue status
+    issue_table = dataset.issue_table()
+
+    # 4. Export issues grouped by file. One XSLX per project, one sheet per software version
+    if output is None:
+        output = XlsxOutput(constant_memory=constant_memory)
+    # With several jobs, the versions of all projects are aggregated in the process pool (LOC included,
+    # unless already in the dataset) and results are merged in project/version order
+    executor = _report_process_pool(jobs, issue_table)
+    # Otherwise file LOC is fetched in the background while issues are aggregated
+    loc_executor = None
+    if executor is None:
+        loc_executor = ThreadPoolExecutor(max_workers=max(1, dataset.max_concurrency))
+    try:
+        if executor is not None:
+            version_futures = {}
+            for project_name in project_analyses:
+                for current_analysis in project_analyses[project_name]:
+                    version_futures[current_analysis] = executor.submit(
+                        _version_td_characterization_job,
+                        current_analysis,
+                        dataset.fetched_file_measures(
+                            project_name + "." + current_analysis.version
+                        )
+                        is None,
+                    )
+        for project_name in project_analyses:
+            logger.debug(
+                "Aggregate technical debt at file level in each software version for project - %s",
+                project_name,
+            )
+            # We hit the SonarQube instance with individual projects for ncloc information
+            # (this is not kept for previous versions of the project)
+            # Dictionary of (<project analysis>, <future of {<file key>: {"ncloc": <value>}}>) entries
+            version_loc_futures = {}
+            if executor is None:
+                for current_analysis in project_analyses[project_name]:
+                    version_loc_futures[current_analysis] = loc_executor.submit(
+                        dataset.file_measures,
+                        project_name + "." + current_analysis.version,
+                    )
+            report = output.open(
+                "technical_debt_by_software_version_and_file", {"project": project_name}
+            )
+
+            # The overall sheet has a column per version, so its rows are only written once all versions are analysed
+            # (spreadsheets only, other backends get long-form tables per version)
+            if output.spreadsheet:
+                overall_sheet = report.table(
+                    "overall",
+                    ["version"] + [x.version for x in project_analyses[project_name]],
+                    sheet="Overall",
                 )
-                assert (
-                    tup[1]["TD"]
-                    == tup[1]["BLOCKER"]
-                    + tup[1]["CRITICAL"]
-                    + tup[1]["MAJOR"]
-                    + tup[1]["MINOR"]
-                    + tup[1]["INFO"]
+            # Dictionary of (<project analysis>, {<VERSION_SUMMARY_COLUMNS column>: <debt>}) entries
+            version_summaries = {}
+            # Dictionary of (<project analysis>, <last row of the version sheet>) entries
+            version_rows = {}
+
+            # Technical debt in this software version
+            # a. Calculated at tag level
+            software_version_td_tag_level = {}
+            # b. Calculated at rule level
+            software_version_td_rule_level = {}
+
+            for current_analysis in project_analyses[project_name]:
+                logger.debug("Analyzing - %s", current_analysis.version)
+                project_sheet = report.table(
+                    "file_debt",
+                    [
+                        "component",
+                        "debt",
+                        "LOC",
+                        "Blocker",
+                        "Critical",
+                        "Major",
+                        "Minor",
+                        "Info",
+                        "Bug",
+                        "Code Smell",
+                        "Vulnerability",
+                    ],
+                    sheet=current_analysis.version,
+                    partition={"version": current_analysis.version},
+                    header_style=True,
+                    column_widths={0: 80, 9: 12, 10: 12},
                 )
 
-                # One file / its TD on every line
-                # Leave out project name and src/; e.g. "FreeMind:src/"
-                file_name = tup[0][tup[0].index("src") :]
-                project_sheet.write(row, 0, file_name)
-                project_sheet.write(row, 1, tup[1]["TD"])
-                # Column 2 is LOC and is handled below
-                project_sheet.write(row, 3, tup[1]["BLOCKER"])
-                project_sheet.write(row, 4, tup[1]["CRITICAL"])
-                project_sheet.write(row, 5, tup[1]["MAJOR"])
-                project_sheet.write(row, 6, tup[1]["MINOR"])
-                project_sheet.write(row, 7, tup[1]["INFO"])
-                project_sheet.write(row, 8, tup[1]["BUG"])
-                project_sheet.write(row, 9, tup[1]["CODE_SMELL"])
-                project_sheet.write(row, 10, tup[1]["VULNERABILITY"])
-
-                # We hit the SonarQube instance with individual projects for ncloc information
-                # (this is not kept for previous versions of the project)
-                component_id = (
-                    project_name + "." + current_analysis.version + ":" + file_name
-                )
-                res = requests.get(
-                    SONAR_SERVER_SINGLE_URL + "/api/measures/component",
-                    auth=HTTPBasicAuth("admin", "Parola123456789!"),
-                    params={
-                        "component": component_id,
-                        "metricKeys": "ncloc,sqale_index",
-                    },
-                ).json()
-
-                # Certain files cannot be found, as they are renamed/moved in newer versions, but this information
-                # is not persisted for the older project versions in the history
-
-                if "errors" in res:
-                    logger.debug("error " + res["errors"][0]["msg"])
-                    project_sheet.write(row, 2, "n/a")
+                # Technical debt by tag, by rule and by file, and the LOC of every file in this version
+                if executor is not None:
+                    with metrics.stage("detailed.wait"):
+                        (
+                            tag_debt,
+                            rule_debt,
+                            component_td,
+                            version_loc,
+                            worker_metrics,
+                        ) = version_futures.pop(current_analysis).result()
+                    metrics.merge(worker_metrics)
+                    # LOC fetched by the worker is kept for the other reports
+                    version_key = project_name + "." + current_analysis.version
+                    if version_loc is None:
+                        version_loc = dataset.fetched_file_measures(version_key)
+                    else:
+                        dataset.add_file_measures(version_key, version_loc)
                 else:
-                    project_sheet.write(
-                        row, 2, int(res["component"]["measures"][0]["value"])
+                    with metrics.stage("detailed.aggregate"):
+                        tag_debt, rule_debt, component_td = (
+                            _version_td_characterization(issue_table, current_analysis)
+                        )
+                    # Prefetched above
+                    with metrics.stage("detailed.wait"):
+                        version_loc = version_loc_futures.pop(current_analysis).result()
+                software_version_td_tag_level[current_analysis] = tag_debt
+                software_version_td_rule_level[current_analysis] = rule_debt
+
+                # Sort components by technical debt using a list
+                components = []
+                for comp in component_td:
+                    components.append((comp, component_td[comp]))
+                components.sort(key=lambda x: x[1]["TD"], reverse=True)
+
+                row = 1
+                for tup in components:
+                    # Sanity checks
+                    assert (
+                        tup[1]["TD"]
+                        == tup[1]["BUG"]
+                        + tup[1]["CODE_SMELL"]
+                        + tup[1]["VULNERABILITY"]
+                    )
+                    assert (
+                        tup[1]["TD"]
+                        == tup[1]["BLOCKER"]
+                        + tup[1]["CRITICAL"]
+                        + tup[1]["MAJOR"]
+                        + tup[1]["MINOR"]
+                        + tup[1]["INFO"]
                     )
-                row += 1
-
-            # Quintiles!
-            step = len(components) // 5
-            q1 = components[:step]
-            q2 = components[step : 2 * step]
-            q3 = components[2 * step : 3 * step]
-            q4 = components[3 * step : 4 * step]
-            q5 = components[4 * step :]
-            assert len(components) == len(q1) + len(q2) + len(q3) + len(q4) + len(q5)
-
-            overall_sheet.write(0, overall_sheet_col, current_analysis.version)
-            overall_sheet.write(1, overall_sheet_col, sum(x[1]["TD"] for x in q1))
-            overall_sheet.write(2, overall_sheet_col, sum(x[1]["TD"] for x in q2))
-            overall_sheet.write(3, overall_sheet_col, sum(x[1]["TD"] for x in q3))
-            overall_sheet.write(4, overall_sheet_col, sum(x[1]["TD"] for x in q4))
-            overall_sheet.write(5, overall_sheet_col, sum(x[1]["TD"] for x in q5))
-
-            # Excel CORREL formula. e.g. '=CORREL('0.1pre'!B2:B10,'0.1pre'!C2:C10)'
-            correl_formula = (
-                "=CORREL('"
-                + current_analysis.version
-                + "'!B2:B"
-                + str(row)
-                + ",'"
-                + current_analysis.version
-                + "'!C2:C"
-                + str(row)
-                + ")"
-            )
-            overall_sheet.write(6, overall_sheet_col, correl_formula)
 
-            # Technical debt broken down by severity / type
-            overall_sheet.write(
-                8, overall_sheet_col, sum(x[1]["BLOCKER"] for x in components)
-            )
-            overall_sheet.write(
-                9, overall_sheet_col, sum(x[1]["CRITICAL"] for x in components)
-            )
-            overall_sheet.write(
-                10, overall_sheet_col, sum(x[1]["MAJOR"] for x in components)
-            )
-            overall_sheet.write(
-                11, overall_sheet_col, sum(x[1]["MINOR"] for x in components)
-            )
-            overall_sheet.write(
-                12, overall_sheet_col, sum(x[1]["INFO"] for x in components)
-            )
+                    # One file / its TD on every line
+                    # Leave out project name and src/; e.g. "FreeMind:src/"
+                    file_name = tup[0][tup[0].index("src") :]
 
-            overall_sheet.write(
-                14, overall_sheet_col, sum(x[1]["BUG"] for x in components)
-            )
-            overall_sheet.write(
-                15, overall_sheet_col, sum(x[1]["VULNERABILITY"] for x in components)
-            )
-            overall_sheet.write(
-                16, overall_sheet_col, sum(x[1]["CODE_SMELL"] for x in components)
-            )
-            overall_sheet_col += 1
-
-        # a. Technical debt broken down at tag level
-        # We need analysis of all software versions to order tags by incurred debt
-        tag_dict = {}
-        for project_analysis in software_version_td_tag_level:
-            for tag in software_version_td_tag_level[project_analysis]:
-                if tag not in tag_dict:
-                    tag_dict[tag] = 0
-                tag_dict[tag] += software_version_td_tag_level[project_analysis][tag]
-        tag_list = list(tag_dict.keys())
-        tag_list.sort(key=lambda x: tag_dict[x], reverse=True)
-
-        # Write tag names
-        row = 18
-        for tag in tag_list:
-            overall_sheet.write(row, 0, tag)
-            row += 1
-
-        # Write TD for each tag per software version
-        col = 1
-        for project_analysis in software_version_td_tag_level:
-            row = 18
-            for tag in tag_list:
-                if tag not in software_version_td_tag_level[project_analysis]:
-                    overall_sheet.write(row, col, 0)
-                else:
-                    overall_sheet.write(
-                        row,
-                        col,
-                        int(software_version_td_tag_level[project_analysis][tag]),
+                    # Certain files cannot be found, as they are renamed/moved in newer versions, but this information
+                    # is not persisted for the older project versions in the history
+                    component_id = (
+                        project_name + "." + current_analysis.version + ":" + file_name
                     )
-                row += 1
-            col += 1
-
-        # b. Technical debt broken down at rule level
-        rule_dict = {}
-        for project_analysis in software_version_td_rule_level:
-            for rule in software_version_td_rule_level[project_analysis]:
-                if rule not in rule_dict:
-                    rule_dict[rule] = 0
-                rule_dict[rule] += software_version_td_rule_level[project_analysis][
-                    rule
+                    file_loc = version_loc.get(component_id, {})
+                    if "ncloc" not in file_loc:
+                        logger.debug("error Component key '%s' not found", component_id)
+                        loc = "n/a"
+                    else:
+                        loc = int(file_loc["ncloc"])
+
+                    project_sheet.write_row(
+                        [
+                            file_name,
+                            tup[1]["TD"],
+                            loc,
+                            tup[1]["BLOCKER"],
+                            tup[1]["CRITICAL"],
+                            tup[1]["MAJOR"],
+                            tup[1]["MINOR"],
+                            tup[1]["INFO"],
+                            tup[1]["BUG"],
+                            tup[1]["CODE_SMELL"],
+                            tup[1]["VULNERABILITY"],
+                        ],
+                    )
+                    row += 1
+
+                # Quintiles!
+                step = len(components) // 5
+                q1 = components[:step]
+                q2 = components[step : 2 * step]
+                q3 = components[2 * step : 3 * step]
+                q4 = components[3 * step : 4 * step]
+                q5 = components[4 * step :]
+                assert len(components) == len(q1) + len(q2) + len(q3) + len(q4) + len(
+                    q5
+                )
+
+                # Technical debt by file quintile, then broken down by severity / type
+                version_summaries[current_analysis] = {
+                    "q1": sum(x[1]["TD"] for x in q1),
+                    "q2": sum(x[1]["TD"] for x in q2),
+                    "q3": sum(x[1]["TD"] for x in q3),
+                    "q4": sum(x[1]["TD"] for x in q4),
+                    "q5": sum(x[1]["TD"] for x in q5),
+                    "blocker": sum(x[1]["BLOCKER"] for x in components),
+                    "critical": sum(x[1]["CRITICAL"] for x in components),
+                    "major": sum(x[1]["MAJOR"] for x in components),
+                    "minor": sum(x[1]["MINOR"] for x in components),
+                    "info": sum(x[1]["INFO"] for x in components),
+                    "bug": sum(x[1]["BUG"] for x in components),
+                    "vulnerability": sum(x[1]["VULNERABILITY"] for x in components),
+                    "code_smell": sum(x[1]["CODE_SMELL"] for x in components),
+                }
+                version_rows[current_analysis] = row
+
+            # a. Technical debt broken down at tag level
+            # We need analysis of all software versions to order tags by incurred debt
+            tag_dict = {}
+            for project_analysis in software_version_td_tag_level:
+                for tag in software_version_td_tag_level[project_analysis]:
+                    if tag not in tag_dict:
+                        tag_dict[tag] = 0
+                    tag_dict[tag] += software_version_td_tag_level[project_analysis][
+                        tag
+                    ]
+            tag_list = list(tag_dict.keys())
+            tag_list.sort(key=lambda x: tag_dict[x], reverse=True)
+
+            # b. Technical debt broken down at rule level
+            rule_dict = {}
+            for project_analysis in software_version_td_rule_level:
+                for rule in software_version_td_rule_level[project_analysis]:
+                    if rule not in rule_dict:
+                        rule_dict[rule] = 0
+                    rule_dict[rule] += software_version_td_rule_level[project_analysis][
+                        rule
+                    ]
+            rule_list = list(rule_dict.keys())
+            rule_list.sort(key=lambda x: rule_dict[x], reverse=True)
+
+            # c. Technical debt quartiles by rules
+            # do 20% of rules generate 80% of technical debt?
+            # Dictionary of (<project analysis>, [<Q1 debt>, .., <Q5 debt>]) entries
+            rule_quintiles = {}
+            for project_analysis in software_version_td_rule_level:
+                rules_debt_dict = software_version_td_rule_level[project_analysis]
+                rules_debt_filtered_dict = {
+                    k: v for k, v in rules_debt_dict.items() if v > 0
+                }
+                rules_debt_list = [(k, v) for k, v in rules_debt_filtered_dict.items()]
+                rules_debt_list.sort(key=lambda x: x[1], reverse=True)
+                step = len(rules_debt_list) // 5
+
+                q1 = rules_debt_list[:step]
+                q2 = rules_debt_list[step : 2 * step]
+                q3 = rules_debt_list[2 * step : 3 * step]
+                q4 = rules_debt_list[3 * step : 4 * step]
+                q5 = rules_debt_list[4 * step :]
+                assert len(rules_debt_list) == len(q1) + len(q2) + len(q3) + len(
+                    q4
+                ) + len(q5)
+
+                rule_quintiles[project_analysis] = [
+                    sum(x[1] for x in q1),
+                    sum(x[1] for x in q2),
+                    sum(x[1] for x in q3),
+                    sum(x[1] for x in q4),
+                    sum(x[1] for x in q5),
                 ]
-        rule_list = list(rule_dict.keys())
-        rule_list.sort(key=lambda x: rule_dict[x], reverse=True)
-
-        # Write rule identifiers
-        row = 18 + len(tag_list) + 1
-        for rule in rule_list:
-            overall_sheet.write(row, 0, rule)
-            row += 1
-
-        # Write TD for each rule per software version
-        col = 1
-        for project_analysis in software_version_td_rule_level:
-            row = 18 + len(tag_list) + 1
-            for rule in rule_list:
-                if rule not in software_version_td_rule_level[project_analysis]:
-                    overall_sheet.write(row, col, 0)
-                else:
-                    overall_sheet.write(
-                        row,
-                        col,
-                        int(software_version_td_rule_level[project_analysis][rule]),
+
+            if output.spreadsheet:
+                _write_overall_sheet(
+                    overall_sheet,
+                    project_analyses[project_name],
+                    version_summaries,
+                    version_rows,
+                    software_version_td_tag_level,
+                    software_version_td_rule_level,
+                    rule_quintiles,
+                    tag_list,
+                    rule_list,
+                )
+            else:
+                # Long-form tables, one partition per version
+                for project_analysis in project_analyses[project_name]:
+                    partition = {"version": project_analysis.version}
+                    summary_table = report.table(
+                        "version_summary", VERSION_SUMMARY_COLUMNS, partition=partition
                     )
-                row += 1
-            col += 1
-
-        # c. Technical debt quartiles by rules
-        # do 20% of rules generate 80% of technical debt?
-        row = 18 + len(tag_list) + len(rule_list) + 2
-        overall_sheet.write(row, 0, "Q1 (rule)")
-        overall_sheet.write(row + 1, 0, "Q2 (rule)")
-        overall_sheet.write(row + 2, 0, "Q3 (rule)")
-        overall_sheet.write(row + 3, 0, "Q4 (rule)")
-        overall_sheet.write(row + 4, 0, "Q5 (rule)")
-
-        col = 1
-        for project_analysis in software_version_td_rule_level:
-            rules_debt_dict = software_version_td_rule_level[project_analysis]
-            rules_debt_filtered_dict = {
-                k: v for k, v in rules_debt_dict.items() if v > 0
-            }
-            rules_debt_list = [(k, v) for k, v in rules_debt_filtered_dict.items()]
-            rules_debt_list.sort(key=lambda x: x[1], reverse=True)
-            step = len(rules_debt_list) // 5
-
-            q1 = rules_debt_list[:step]
-            q2 = rules_debt_list[step : 2 * step]
-            q3 = rules_debt_list[2 * step : 3 * step]
-            q4 = rules_debt_list[3 * step : 4 * step]
-            q5 = rules_debt_list[4 * step :]
-            assert len(rules_debt_list) == len(q1) + len(q2) + len(q3) + len(q4) + len(
-                q5
-            )
+                    summary_table.write_row(
+                        [
+                            version_summaries[project_analysis][column]
+                            for column in VERSION_SUMMARY_COLUMNS
+                        ]
+                    )
+                    tag_table = report.table(
+                        "tag_debt", ["tag", "debt"], partition=partition
+                    )
+                    tag_debt = software_version_td_tag_level[project_analysis]
+                    for tag in tag_list:
+                        tag_table.write_row([tag, int(tag_debt.get(tag, 0))])
+                    rule_table = report.table(
+                        "rule_debt", ["rule", "debt"], partition=partition
+                    )
+                    rule_debt = software_version_td_rule_level[project_analysis]
+                    for rule in rule_list:
+                        rule_table.write_row([rule, int(rule_debt.get(rule, 0))])
+                    quintile_table = report.table(
+                        "rule_quintiles", ["q", "debt"], partition=partition
+                    )
+                    for q, debt in enumerate(rule_quintiles[project_analysis], 1):
+                        quintile_table.write_row([q, debt])
 
-            overall_sheet.write(row, col, sum(x[1] for x in q1))
-            overall_sheet.write(row + 1, col, sum(x[1] for x in q2))
-            overall_sheet.write(row + 2, col, sum(x[1] for x in q3))
-            overall_sheet.write(row + 3, col, sum(x[1] for x in q4))
-            overall_sheet.write(row + 4, col, sum(x[1] for x in q5))
-            col += 1
+            report.close()
+    finally:
+        # If a version fails, the queued jobs of the remaining versions are dropped
+        for pool in (executor, loc_executor):
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
 
-        work_book.close()
 
+"""
+    Report pipeline. The selected reports run against one ReportDataset, so SonarQube is crawled once.
+    e.g. python analyses.py all --format parquet --output-dir reports
+         python analyses.py technical-debt detailed --mirror sonarqube_issues.sqlite
+"""
+REPORTS = ["technical-debt", "detailed", "package-history"]
 
-if __name__ == "__main__":
-    """
-    Calculate technical debt ratios by application version and export to 'technical_debt_by_software_version.xlxs'
-    """
-    # export_technical_debt_measures_to_xlsx()
 
+def run_reports(reports, dataset=None, output=None, jobs=1, bulk=True):
     """
-    Calculate technical debt at tag and rule levels per application version
+    Run a selection of reports against a shared dataset
+    params:
+        reports - List of REPORTS names, or ["all"]; reports run in REPORTS order
+        dataset - ReportDataset (a new one is created if None)
+        output  - Output backend from report_output (XLSX if None)
+        jobs    - Number of processes for the detailed and package history reports
+        bulk    - Fetch file measures with /api/measures/component_tree, otherwise one call per file
     """
-    # export_detailed_td_characterization_by_software_version_xlsx()
+    if dataset is None:
+        dataset = ReportDataset()
+    if output is None:
+        output = XlsxOutput()
+    if "all" in reports:
+        reports = REPORTS
+
+    # Each report stage includes the dataset stages it triggers
+    if "technical-debt" in reports:
+        """
+        Calculate technical debt ratios by application version and export to 'technical_debt_by_software_version.xlxs'
+        """
+        with metrics.stage("report.technical-debt"):
+            export_technical_debt_measures_to_xlsx(output=output, dataset=dataset)
+    if "detailed" in reports:
+        """
+        Calculate technical debt at tag and rule levels per application version
+        """
+        with metrics.stage("report.detailed"):
+            export_detailed_td_characterization_by_software_version_xlsx(
+                output=output, jobs=jobs, dataset=dataset
+            )
+    if "package-history" in reports:
+        """
+        Calculate technical debt at package level and correlate it with package LOC
+        """
+        with metrics.stage("report.package-history"):
+            calculate_package_technical_debt_history(
+                output=output,
+                jobs=jobs,
+                bulk=bulk,
+                max_concurrency=dataset.max_concurrency,
+                dataset=dataset,
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export the technical debt reports of the SonarQube projects"
+    )
+    parser.add_argument(
+        "reports",
+        nargs="+",
+        choices=REPORTS + ["all"],
+        help="Reports to produce ('all' for every report)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(OUTPUT_FORMATS),
+        default="xlsx",
+        help="Output format",
+    )
+    parser.add_argument("--output-dir", default=".", help="Output directory")
+    parser.add_argument(
+        "--constant-memory",
+        action="store_true",
+        help="Flush each XLSX row to disk once written",
+    )
+    parser.add_argument(
+        "--cache",
+        default="sonarqube_cache.sqlite",
+        help="SonarQube response cache ('' disables caching)",
+    )
+    parser.add_argument(
+        "--replay-only",
+        action="store_true",
+        help="Only use cached responses, never contact the servers",
+    )
+    parser.add_argument(
+        "--mirror",
+        help="Sync an IssueMirror at this path and read issues from it",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default="sonarqube_crawl.sqlite",
+        help="Checkpoint of the issue crawl, a failed crawl resumes from it ('' disables it)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=1,
+        help="Maximum number of API calls in flight",
+    )
+    parser.add_argument(
+        "--fixed-concurrency",
+        action="store_true",
+        help="Always allow --max-concurrency calls in flight, instead of adapting to server latency",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of report processes",
+    )
+    parser.add_argument(
+        "--per-file",
+        action="store_true",
+        help="Fetch file measures with one call per file",
+    )
+    parser.add_argument(
+        "--metrics-json", help="Write API call and stage metrics to this JSON file"
+    )
+    parser.add_argument(
+        "--metrics-prometheus",
+        help="Write API call and stage metrics to this Prometheus textfile",
+    )
+    parser.add_argument(
+        "--log-level",
+        default="DEBUG",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Level of the metrics logger",
+    )
+    parser.add_argument(
+        "--log-file", default="metrics.log", help="Log file ('' disables it)"
+    )
+    parser.add_argument(
+        "--log-sample",
+        type=int,
+        default=1,
+        help="Keep one per-call API debug line in this many",
+    )
+    parser.add_argument(
+        "--log-rate",
+        type=float,
+        help="Keep at most this many per-call API debug lines per second",
+    )
+    args = parser.parse_args(argv)
+
+    configure_logging(
+        level=args.log_level,
+        log_file=args.log_file or None,
+        api_sample_every=args.log_sample,
+        api_max_per_second=args.log_rate,
+    )
 
     """
-    Calculate technical debt at package level and correlate it with package LOC
+    Reuse SonarQube responses stored by previous runs (replay_only=True never contacts the servers)
     """
-    # calculate_package_technical_debt_history()
+    if args.cache:
+        set_response_cache(ResponseCache(args.cache, replay_only=args.replay_only))
+    if args.fixed_concurrency:
+        for server_url in (SONAR_SERVER_HISTORY_URL, SONAR_SERVER_SINGLE_URL):
+            configure_client(server_url, adaptive_concurrency=False)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.format == "xlsx":
+        output = XlsxOutput(args.output_dir, constant_memory=args.constant_memory)
+    else:
+        output = OUTPUT_FORMATS[args.format](args.output_dir)
+
+    mirror = None
+    # Issues read from a mirror are not crawled
+    checkpoint = (
+        CrawlCheckpoint(args.checkpoint)
+        if args.checkpoint and not args.mirror
+        else None
+    )
+    try:
+        catalog = ProjectCatalog()
+        with metrics.stage("dataset.catalog"):
+            catalog.load(args.max_concurrency)
+        if args.mirror:
+            mirror = IssueMirror(args.mirror)
+            with metrics.stage("mirror.sync"):
+                mirror.sync(catalog, args.max_concurrency)
+
+        run_reports(
+            args.reports,
+            ReportDataset(catalog, mirror, args.max_concurrency, checkpoint),
+            output,
+            jobs=args.jobs,
+            bulk=not args.per_file,
+        )
+    finally:
+        if mirror is not None:
+            mirror.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        # Metrics of failed runs are the most interesting ones
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prometheus:
+            metrics.write_prometheus(args.metrics_prometheus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import analyses
+import sonar_qube_api
+from fake_sonarqube import FakeSonarQube, SyntheticData
+from instrumentation import metrics
+from report_output import OUTPUT_FORMATS, XlsxOutput
+
+"""
+    Benchmark of the issue crawl and the reports against the fake_sonarqube stand-in servers.
+    Every benchmark starts from a cold ReportDataset (no response cache) and reports:
+        calls  - API calls sent by this process and its report workers (instrumentation metrics) and requests
+                 served (server side)
+        wall   - Wall time in seconds
+        memory - Peak traced Python memory in MB (tracemalloc, this process only)
+    e.g. python benchmark.py --issues 50000 --latency 0.02 --max-concurrency 8
+"""
+
+BENCHMARKS = ["issues"] + analyses.REPORTS
+
+
+def _api_calls():
+    return sum(
+        stats["calls"]
+        for endpoints in metrics.summary()["servers"].values()
+        for stats in endpoints.values()
+    )
+
+
+def _run_benchmark(name, args, output):
+    dataset = analyses.ReportDataset(max_concurrency=args.max_concurrency)
+    if name == "issues":
+        sonar_qube_api.api_issues_search(
+            ["java"],
+            resolutions=[],
+            types=["CODE_SMELL", "BUG", "VULNERABILITY"],
+            catalog=dataset.catalog,
+            max_concurrency=args.max_concurrency,
+        )
+    else:
+        analyses.run_reports(
+            [name], dataset, output, jobs=args.jobs, bulk=not args.per_file
+        )
+
+
+def run_benchmarks(args, servers):
+    """
+    output:
+        List of result dictionaries, one per benchmark
+    """
+    if args.format == "xlsx":
+        output = XlsxOutput(args.output_dir, constant_memory=args.constant_memory)
+    else:
+        output = OUTPUT_FORMATS[args.format](args.output_dir)
+
+    results = []
+    devnull = open(os.devnull, "w")
+    for name in args.benchmarks:
+        metrics.reset()
+        for server in servers:
+            server.requests.clear()
+            # Concurrency limits are learned again in each benchmark
+            if args.fixed_concurrency:
+                sonar_qube_api.configure_client(server.url, adaptive_concurrency=False)
+            else:
+                sonar_qube_api.configure_concurrency_limiter(server.url)
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        # Reports print their progress
+        with contextlib.redirect_stdout(None if args.verbose else devnull):
+            _run_benchmark(name, args, output)
+        wall = time.perf_counter() - start
+        peak = None
+        if args.memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results.append(
+            {
+                "benchmark": name,
+                "api_calls": _api_calls(),
+                "requests_served": sum(sum(s.requests.values()) for s in servers),
+                "wall_seconds": wall,
+                "peak_memory_mb": None if peak is None else peak / 2**20,
+                "gauges": metrics.summary()["gauges"],
+            }
+        )
+    devnull.close()
+    return results
+
+
+def _print_results(results):
+    print(
+        "%-16s %10s %10s %10s %10s"
+        % ("benchmark", "calls", "served", "wall (s)", "peak (MB)")
+    )
+    for result in results:
+        peak = result["peak_memory_mb"]
+        print(
+            "%-16s %10d %10d %10.2f %10s"
+            % (
+                result["benchmark"],
+                result["api_calls"],
+                result["requests_served"],
+                result["wall_seconds"],
+                "-" if peak is None else "%.1f" % peak,
+            )
+        )
+        for entry in result["gauges"].get("concurrency_limit", []):
+            print(
+                "%-16s concurrency limit %s: %d"
+                % ("", entry["labels"]["server"], entry["value"])
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the issue crawl and the reports against local stand-in SonarQube servers"
+    )
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        choices=BENCHMARKS + ["all"],
+        default="all",
+        help="Benchmarks to run (default: all)",
+    )
+    data_group = parser.add_argument_group("synthetic data")
+    data_group.add_argument("--projects", type=int, default=3)
+    data_group.add_argument("--versions", type=int, default=10)
+    data_group.add_argument("--files", type=int, default=200)
+    data_group.add_argument(
+        "--issues", type=int, default=20000, help="Issues per project"
+    )
+    data_group.add_argument("--seed", type=int, default=0)
+    server_group = parser.add_argument_group("servers")
+    server_group.add_argument(
+        "--latency", type=float, default=0.0, help="Latency of every request (s)"
+    )
+    server_group.add_argument(
+        "--jitter", type=float, default=0.0, help="Additional random latency (s)"
+    )
+    server_group.add_argument(
+        "--load-factor",
+        type=float,
+        default=0.0,
+        help="Additional latency per concurrent request (s)",
+    )
+    run_group = parser.add_argument_group("client")
+    run_group.add_argument("--max-concurrency", type=int, default=1)
+    run_group.add_argument("--fixed-concurrency", action="store_true")
+    run_group.add_argument("--jobs", type=int, default=1)
+    run_group.add_argument("--per-file", action="store_true")
+    run_group.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="xlsx")
+    run_group.add_argument("--constant-memory", action="store_true")
+    run_group.add_argument(
+        "--output-dir", help="Report output directory (a temporary one by default)"
+    )
+    run_group.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="Do not trace memory (tracemalloc slows down the run)",
+    )
+    run_group.add_argument(
+        "--verbose", action="store_true", help="Show the report progress output"
+    )
+    run_group.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+    if args.benchmarks == "all" or "all" in args.benchmarks:
+        args.benchmarks = BENCHMARKS
+
+    data = SyntheticData(
+        projects=args.projects,
+        versions=args.versions,
+        files=args.files,
+        issues=args.issues,
+        seed=args.seed,
+    )
+    latency = {
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "load_factor": args.load_factor,
+    }
+    with contextlib.ExitStack() as stack:
+        history = stack.enter_context(FakeSonarQube(data, "history", **latency))
+        single = stack.enter_context(FakeSonarQube(data, "single", **latency))
+        if args.output_dir is None:
+            args.output_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(args.output_dir, exist_ok=True)
+
+        sonar_qube_api.set_response_cache(None)
+        sonar_qube_api.set_server_urls(history.url, single.url)
+        # The package history report reads its versions from PROJECTS
+        analyses.PROJECTS = data.project_versions()
+
+        results = run_benchmarks(args, [history, single])
+
+    _print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
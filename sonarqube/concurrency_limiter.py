@@ -0,0 +1,172 @@
+import threading
+
+from instrumentation import metrics
+
+"""
+    AIMD (additive increase, multiplicative decrease) limit on the API calls in flight to one server.
+    The limit grows by one per window of calls while the server keeps up (window p95 latency close to the
+    baseline, the lowest p95 seen) and the limit was actually reached, and is cut when the server is overloaded:
+        - window p95 latency above latency_tolerance * baseline
+          (latencies are relative to the fastest call of the same endpoint, as endpoints differ in cost)
+        - 429 or 5xx responses (also when retried), connection errors and timeouts
+    Thread pools still cap the calls in flight (max_concurrency), the limiter only holds calls back.
+    Each process has its own limiter; processes calling a server at the same time share its limits (see share).
+"""
+
+# Completed calls per latency window
+DEFAULT_WINDOW = 20
+# Limit when a server is first contacted
+DEFAULT_INITIAL_LIMIT = 4
+# Window p95 latency above this multiple of the baseline means the server is slowing down
+DEFAULT_LATENCY_TOLERANCE = 2.0
+# The limit is multiplied by this factor on overload
+DEFAULT_DECREASE_FACTOR = 0.5
+# The fastest call latency of each endpoint rises by this fraction per window, so it follows a server that
+# became slower for good
+BASELINE_DRIFT = 0.01
+
+
+def _p95(samples):
+    ordered = sorted(samples)
+    return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class AIMDLimiter:
+    """
+    Thread-safe AIMD concurrency limit for one server
+    e.g.
+        limiter.acquire()
+        ... call ...
+        limiter.release(seconds, overloaded, endpoint)
+    """
+
+    def __init__(
+        self,
+        name,
+        initial_limit=DEFAULT_INITIAL_LIMIT,
+        min_limit=1,
+        max_limit=16,
+        window=DEFAULT_WINDOW,
+        latency_tolerance=DEFAULT_LATENCY_TOLERANCE,
+        decrease_factor=DEFAULT_DECREASE_FACTOR,
+    ):
+        """
+        params:
+            name              - Server name used as the metrics label (e.g. the server URL)
+            initial_limit     - Limit before any call completed
+            min_limit         - The limit never goes below this
+            max_limit         - The limit never goes above this (e.g. the connection pool size)
+            window            - Completed calls per latency window
+            latency_tolerance - Window p95 latency above latency_tolerance * baseline cuts the limit
+            decrease_factor   - Multiplicative decrease of the limit on overload
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.limit = max(min_limit, min(initial_limit, max_limit))
+        self.in_flight = 0
+        self.baseline = None
+        self.p95 = None
+        self.decreases = 0
+        # Dictionary of (<endpoint>, <fastest call latency>) entries
+        self._fastest = {}
+        self._samples = []
+        # The limit was reached during the current window
+        self._saturated = False
+        # Calls completed since the last decrease, calls sent before it must not cut the limit again
+        self._since_decrease = 0
+        self._condition = threading.Condition()
+        self._publish()
+
+    def reset(self):
+        """
+        Forget calls in flight and use a new lock (used in forked processes), the limit is kept
+        """
+        self._condition = threading.Condition()
+        self.in_flight = 0
+        self._samples = []
+        self._saturated = False
+
+    def share(self, processes):
+        """
+        Keep this process's share of the limits, when the given number of processes call the server at the same
+        time (e.g. report worker processes), so their calls in flight together stay within the limits
+        """
+        with self._condition:
+            self.max_limit = max(self.min_limit, self.max_limit // processes)
+            self.limit = max(
+                self.min_limit, min(self.limit // processes, self.max_limit)
+            )
+            self._publish()
+
+    def acquire(self):
+        """
+        Wait until a call can be sent
+        """
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._saturated = True
+                self._condition.wait()
+            self.in_flight += 1
+            if self.in_flight >= self.limit:
+                self._saturated = True
+
+    def release(self, seconds, overloaded=False, endpoint=None):
+        """
+        params:
+            seconds    - Wall time of the call
+            overloaded - The server answered 429 or 5xx, or the call failed
+            endpoint   - Endpoint of the call (e.g. '/api/issues/search')
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._since_decrease += 1
+            if overloaded:
+                # Once per round trip at the old limit
+                if self._since_decrease >= self.limit:
+                    self._decrease()
+            else:
+                fastest = self._fastest.get(endpoint)
+                if fastest is None or seconds < fastest:
+                    fastest = self._fastest[endpoint] = max(seconds, 1e-6)
+                self._samples.append(seconds / fastest)
+                if len(self._samples) >= self.window:
+                    self._end_window()
+            self._condition.notify_all()
+            self._publish()
+
+    def _end_window(self):
+        self.p95 = _p95(self._samples)
+        if self.baseline is None or self.p95 < self.baseline:
+            self.baseline = self.p95
+        if self.p95 > self.latency_tolerance * self.baseline:
+            self._decrease()
+        else:
+            if self._saturated and self.limit < self.max_limit:
+                self.limit += 1
+            self._samples = []
+            self._saturated = False
+        for endpoint in self._fastest:
+            self._fastest[endpoint] *= 1 + BASELINE_DRIFT
+
+    def _decrease(self):
+        self.limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        self.decreases += 1
+        self._since_decrease = 0
+        self._samples = []
+        self._saturated = False
+
+    def _publish(self):
+        labels = [("server", self.name)]
+        metrics.set_gauge("concurrency_limit", labels, self.limit)
+        metrics.set_gauge("concurrency_in_flight", labels, self.in_flight)
+        metrics.set_gauge("concurrency_decreases", labels, self.decreases)
+        if self.p95 is not None:
+            # Relative to the fastest call of each endpoint
+            metrics.set_gauge("concurrency_latency_p95_ratio", labels, self.p95)
+            metrics.set_gauge(
+                "concurrency_latency_baseline_ratio", labels, self.baseline
+            )
@@ -0,0 +1,91 @@
+import json
+import sqlite3
+import threading
+
+from response_cache import cache_key
+
+"""
+    Checkpoint of an issue crawl (see sonar_qube_api.api_issues_search).
+    Every fetched issue search page is stored as a (project, query window, page) unit once it is complete.
+    A crawl that failed halfway (error response, killed process) is resumed by running it again: stored units
+    are read back instead of fetched, so the crawl continues from the first incomplete unit.
+    The units are removed once the crawl completes, the next crawl fetches fresh issues.
+"""
+
+
+class CrawlCheckpoint:
+    """
+    SQLite-backed store of the completed units of one issue crawl
+    """
+
+    def __init__(self, path="sonarqube_crawl.sqlite"):
+        """
+        params:
+            path - SQLite database file
+        """
+        self.path = path
+        # Units are stored from the issue search worker threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # One commit per unit, so avoid a full fsync each time
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "key TEXT PRIMARY KEY, project TEXT, window TEXT, page INTEGER, body TEXT)"
+        )
+        self._db.commit()
+
+    def get(self, server_url, path, parameters):
+        """
+        Return the stored page of an issue search call, or None if the unit is not complete
+        params:
+            parameters - call parameters, including the page (ps, p)
+        """
+        key = cache_key(server_url, path, parameters)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body FROM units WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, server_url, path, parameters, result):
+        """
+        Store a complete unit
+        params:
+            parameters - call parameters, including the page (ps, p)
+            result     - JSON response of the call
+        """
+        window = {k: v for k, v in parameters.items() if k not in ("ps", "p")}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, ?)",
+                (
+                    cache_key(server_url, path, parameters),
+                    parameters.get("components"),
+                    json.dumps(window, sort_keys=True, default=str),
+                    parameters["p"],
+                    json.dumps(result),
+                ),
+            )
+            self._db.commit()
+
+    def units(self):
+        """
+        output:
+            Number of stored units
+        """
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM units").fetchone()[0]
+
+    def clear(self):
+        """
+        Remove all units (the crawl is complete)
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM units")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,536 @@
+import bisect
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+"""
+    Local stand-in for the two SonarQube servers, fed by a synthetic data generator.
+    Implements the endpoints used by sonar_qube_api, including paging and the 10k issue search result cap:
+        HISTORY server - /api/projects/search, /api/project_analyses/search, /api/issues/search,
+                         /api/measures/search_history, /api/metrics/search
+        SINGLE server  - /api/measures/component, /api/measures/component_tree, /api/components/tree
+    Meant for benchmarks (see benchmark.py), not as a faithful SonarQube implementation.
+"""
+
+# SonarQube returns at most this many results for one filter, regardless of paging
+RESULT_CAP = 10000
+# Maximum page size accepted by the paged endpoints
+MAX_PAGE_SIZE = 500
+
+SEVERITIES = ["INFO", "MINOR", "MAJOR", "CRITICAL", "BLOCKER"]
+TYPES = ["CODE_SMELL", "BUG", "VULNERABILITY"]
+TAGS = ["bad-practice", "brain-overload", "cert", "clumsy", "cwe", "pitfall", "unused"]
+DEBTS = ["1min", "5min", "10min", "30min", "1h", "1h30min", "4h", "1d", "1d2h"]
+# Metrics of /api/measures/search_history, as requested by the reports
+HISTORY_METRICS = [
+    "ncloc",
+    "classes",
+    "statements",
+    "functions",
+    "development_cost",
+    "sqale_debt_ratio",
+    "sqale_index",
+]
+
+
+def _sq_datetime(python_datetime):
+    return python_datetime.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+
+def _parse_sq_datetime(sq_datetime):
+    # '+' in query strings may arrive decoded as a space
+    return datetime.strptime(sq_datetime.replace(" ", "+"), "%Y-%m-%dT%H:%M:%S%z")
+
+
+class SyntheticData:
+    """
+    Deterministic synthetic SonarQube data
+        projects - P0, P1, ... each with the same number of versions (1.0, 1.1, ...) analysed interval_days apart
+        files    - src/pkg<k>/File<j>.java, file j first appears in a version proportional to j
+        issues   - created on an analysis date (within the first hour), about a third FIXED in a later analysis
+    """
+
+    def __init__(
+        self,
+        projects=3,
+        versions=10,
+        files=200,
+        issues=20000,
+        packages=10,
+        rules=50,
+        seed=0,
+        start=datetime(2010, 1, 4, tzinfo=timezone.utc),
+        interval_days=30,
+    ):
+        """
+        params:
+            projects - Number of projects
+            versions - Number of analysed versions per project
+            files    - Number of files of the last version of each project
+            issues   - Number of issues per project
+            packages - Number of packages files are spread across
+            rules    - Number of distinct rules
+            seed     - Random seed, the same parameters always generate the same data
+        """
+        rng = random.Random(seed)
+        self.projects = ["P" + str(i) for i in range(projects)]
+        # Dictionary of (<project>, [(<version>, <analysis datetime>),...]) entries, sorted by date
+        self.analyses = {}
+        # Dictionary of (<project>, [<issue JSON>,...]) entries, sorted by creation date
+        self.issues = {}
+        # Dictionary of (<project>, [<issue creation datetime>,...]) entries, in the order of issues
+        self.issue_creation_dates = {}
+        # Dictionary of (<project>.<version>, {<file key>: {"ncloc": .., "sqale_index": ..}}) entries
+        self.version_files = {}
+        file_names = [
+            "src/pkg" + str(j % packages) + "/File" + str(j) + ".java"
+            for j in range(files)
+        ]
+
+        for project in self.projects:
+            analyses = [
+                (
+                    "1." + str(v),
+                    start + timedelta(days=v * interval_days, hours=12),
+                )
+                for v in range(versions)
+            ]
+            self.analyses[project] = analyses
+
+            # Files first appear in a version proportional to their index
+            first_version = [j * versions // (files + 1) for j in range(files)]
+            file_loc = [rng.randint(10, 2000) for _ in range(files)]
+            # First version_files[v] files exist in version v
+            version_files = [
+                sum(1 for j in range(files) if first_version[j] <= v)
+                for v in range(versions)
+            ]
+
+            project_issues = []
+            for n in range(issues):
+                created = rng.randrange(versions)
+                file_index = rng.randrange(max(1, version_files[created]))
+                creation = analyses[created][1] + timedelta(seconds=rng.randrange(3600))
+                issue = {
+                    "key": project + "-" + str(n),
+                    "rule": "java:S" + str(100 + rng.randrange(rules)),
+                    "severity": rng.choice(SEVERITIES),
+                    "component": project + ":" + file_names[file_index],
+                    "project": project,
+                    "hash": "%032x" % rng.getrandbits(128),
+                    "message": "Synthetic issue " + str(n),
+                    "type": rng.choice(TYPES),
+                    "tags": rng.sample(TAGS, rng.randint(0, 2)),
+                    "creationDate": _sq_datetime(creation),
+                    "updateDate": _sq_datetime(creation),
+                    "status": "OPEN",
+                }
+                if rng.random() < 0.95:
+                    issue["debt"] = issue["effort"] = rng.choice(DEBTS)
+                if created < versions - 1 and rng.random() < 0.35:
+                    closed = analyses[rng.randint(created + 1, versions - 1)][1]
+                    issue["status"] = "CLOSED"
+                    issue["resolution"] = "FIXED"
+                    issue["closeDate"] = issue["updateDate"] = _sq_datetime(closed)
+                project_issues.append(issue)
+            project_issues.sort(key=lambda x: (x["creationDate"], x["key"]))
+            self.issues[project] = project_issues
+            self.issue_creation_dates[project] = [
+                _parse_sq_datetime(issue["creationDate"]) for issue in project_issues
+            ]
+
+            for v in range(versions):
+                version_key = project + "." + analyses[v][0]
+                self.version_files[version_key] = {
+                    version_key
+                    + ":"
+                    + file_names[j]: {
+                        "ncloc": str(file_loc[j] + 5 * v),
+                        "sqale_index": str(rng.randint(0, 600)),
+                    }
+                    for j in range(files)
+                    if first_version[j] <= v
+                }
+
+    def project_versions(self):
+        """
+        output:
+            Dictionary of (<project>, [<version_1>,...,<version_k>]) entries, the format of analyses.PROJECTS
+        """
+        return {
+            project: [version for version, _ in self.analyses[project]]
+            for project in self.projects
+        }
+
+
+class _Latency:
+    """
+    Injected latency: base + uniform jitter + load_factor * (requests in flight - 1), in seconds
+    """
+
+    def __init__(self, base=0.0, jitter=0.0, load_factor=0.0, seed=0):
+        self.base = base
+        self.jitter = jitter
+        self.load_factor = load_factor
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def __enter__(self):
+        with self._lock:
+            self.in_flight += 1
+            delay = (
+                self.base
+                + self._rng.uniform(0, self.jitter)
+                + self.load_factor * (self.in_flight - 1)
+            )
+        if delay > 0:
+            time.sleep(delay)
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.in_flight -= 1
+
+
+def _page(items, parameters, default_page_size=100):
+    """
+    output:
+        (<status>, <page items>, <paging dict>) tuple, status 400 if the page is beyond RESULT_CAP
+    """
+    page_size = min(int(parameters.get("ps", default_page_size)), MAX_PAGE_SIZE)
+    page = int(parameters.get("p", 1))
+    paging = {"pageIndex": page, "pageSize": page_size, "total": len(items)}
+    if page * page_size > RESULT_CAP:
+        return 400, None, paging
+    return 200, items[(page - 1) * page_size : page * page_size], paging
+
+
+def _cap_error(paging):
+    return {
+        "errors": [
+            {
+                "msg": "Can return only the first "
+                + str(RESULT_CAP)
+                + " results. "
+                + str(paging["pageIndex"] * paging["pageSize"])
+                + "th result asked."
+            }
+        ]
+    }
+
+
+def _not_found(component):
+    return 404, {"errors": [{"msg": "Component key '" + component + "' not found"}]}
+
+
+class FakeSonarQube:
+    """
+    ThreadingHTTPServer serving one SonarQube server role ("history" or "single") from a SyntheticData instance
+    e.g.
+        with FakeSonarQube(data, "history", latency=0.02) as server:
+            sonar_qube_api.set_server_urls(history_url=server.url)
+    """
+
+    def __init__(
+        self,
+        data,
+        role="history",
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        jitter=0.0,
+        load_factor=0.0,
+    ):
+        """
+        params:
+            data        - SyntheticData instance
+            role        - "history" or "single"
+            port        - TCP port (0 = any free port)
+            latency     - Base latency of every request, in seconds
+            jitter      - Additional uniformly distributed latency, in seconds
+            load_factor - Additional latency per concurrent request, in seconds (simulates an overloaded server)
+        """
+        if role not in ("history", "single"):
+            raise RuntimeError("Unknown server role: " + role)
+        self.data = data
+        self.role = role
+        self.latency = _Latency(latency, jitter, load_factor)
+        # Number of requests served, by path
+        self.requests = {}
+        self._requests_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://" + host + ":" + str(port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, as the client pools its connections
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                parameters = {
+                    key: values[-1]
+                    for key, values in parse_qs(
+                        url.query, keep_blank_values=True
+                    ).items()
+                }
+                with server._requests_lock:
+                    server.requests[url.path] = server.requests.get(url.path, 0) + 1
+                with server.latency:
+                    status, body = server.handle(url.path, parameters)
+                content = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def handle(self, path, parameters):
+        """
+        output:
+            (<HTTP status>, <JSON body>) tuple
+        """
+        endpoints = {
+            "history": {
+                "/api/projects/search": self._projects_search,
+                "/api/project_analyses/search": self._project_analyses_search,
+                "/api/issues/search": self._issues_search,
+                "/api/measures/search_history": self._measures_search_history,
+                "/api/metrics/search": self._metrics_search,
+            },
+            "single": {
+                "/api/projects/search": self._projects_search,
+                "/api/measures/component": self._measures_component,
+                "/api/measures/component_tree": self._measures_component_tree,
+                "/api/components/tree": self._components_tree,
+            },
+        }[self.role]
+        if path not in endpoints:
+            return 404, {"errors": [{"msg": "Unknown url : " + path}]}
+        return endpoints[path](parameters)
+
+    """
+        HISTORY server endpoints
+    """
+
+    def _projects_search(self, parameters):
+        if self.role == "history":
+            keys = self.data.projects
+        else:
+            keys = list(self.data.version_files)
+        status, page, paging = _page(keys, parameters)
+        if status != 200:
+            return status, _cap_error(paging)
+        return 200, {
+            "paging": paging,
+            "components": [{"key": k, "name": k, "qualifier": "TRK"} for k in page],
+        }
+
+    def _project_analyses_search(self, parameters):
+        project = parameters.get("project", "")
+        if project not in self.data.analyses:
+            return _not_found(project)
+        # Most recent analysis first
+        analyses = [
+            {
+                "key": project + "-" + version,
+                "date": _sq_datetime(analysis_date),
+                "projectVersion": version,
+                "events": [],
+            }
+            for version, analysis_date in reversed(self.data.analyses[project])
+        ]
+        status, page, paging = _page(analyses, parameters)
+        if status != 200:
+            return status, _cap_error(paging)
+        return 200, {"paging": paging, "analyses": page}
+
+    def _issues_search(self, parameters):
+        project = parameters.get("components", "")
+        issues = self.data.issues.get(project, [])
+        creation_dates = self.data.issue_creation_dates.get(project, [])
+
+        # Issues are sorted by creation date, the creation window is a slice
+        first, last = 0, len(issues)
+        if parameters.get("createdAfter"):
+            first = bisect.bisect_left(
+                creation_dates, _parse_sq_datetime(parameters["createdAfter"])
+            )
+        if parameters.get("createdBefore"):
+            last = bisect.bisect_left(
+                creation_dates, _parse_sq_datetime(parameters["createdBefore"])
+            )
+        filters = {}
+        for name, field in (
+            ("types", "type"),
+            ("severities", "severity"),
+            ("resolutions", "resolution"),
+        ):
+            if parameters.get(name):
+                filters[field] = set(parameters[name].split(","))
+        selected = [
+            issue
+            for issue in issues[first:last]
+            if all(issue.get(field) in values for field, values in filters.items())
+        ]
+
+        if parameters.get("s") == "UPDATE_DATE":
+            # All dates are UTC, so they sort as strings
+            selected.sort(
+                key=lambda x: x["updateDate"],
+                reverse=parameters.get("asc", "true") == "false",
+            )
+
+        status, page, paging = _page(selected, parameters)
+        if status != 200:
+            return status, _cap_error(paging)
+        return 200, {
+            "total": paging["total"],
+            "p": paging["pageIndex"],
+            "ps": paging["pageSize"],
+            "paging": paging,
+            "issues": page,
+        }
+
+    def _measures_search_history(self, parameters):
+        project = parameters.get("component", "")
+        if project not in self.data.analyses:
+            return _not_found(project)
+        metrics = [m for m in parameters.get("metrics", "").split(",") if m]
+        analyses = self.data.analyses[project]
+        measures = []
+        for metric_index, metric in enumerate(metrics):
+            history = [
+                {
+                    "date": _sq_datetime(analysis_date),
+                    "value": str(1000 * (metric_index + 1) + 10 * v),
+                }
+                for v, (_, analysis_date) in enumerate(analyses)
+            ]
+            measures.append({"metric": metric, "history": history})
+        return 200, {
+            "paging": {"pageIndex": 1, "pageSize": 100, "total": len(analyses)},
+            "measures": measures,
+        }
+
+    def _metrics_search(self, parameters):
+        metrics = [
+            {"key": metric, "name": metric, "type": "INT"} for metric in HISTORY_METRICS
+        ]
+        status, page, paging = _page(metrics, parameters)
+        if status != 200:
+            return status, _cap_error(paging)
+        return 200, {
+            "metrics": page,
+            "total": paging["total"],
+            "p": paging["pageIndex"],
+            "ps": paging["pageSize"],
+        }
+
+    """
+        SINGLE server endpoints
+    """
+
+    def _file_measures(self, component):
+        """
+        Measures of a file or project version key, None if not found
+        """
+        if component in self.data.version_files:
+            files = self.data.version_files[component].values()
+            return {
+                "ncloc": str(sum(int(f["ncloc"]) for f in files)),
+                "sqale_index": str(sum(int(f["sqale_index"]) for f in files)),
+            }
+        version_key = component.split(":")[0]
+        return self.data.version_files.get(version_key, {}).get(component)
+
+    def _measures_component(self, parameters):
+        component = parameters.get("component", "")
+        measures = self._file_measures(component)
+        if measures is None:
+            return _not_found(component)
+        metrics = [m for m in parameters.get("metricKeys", "").split(",") if m]
+        return 200, {
+            "component": {
+                "key": component,
+                "qualifier": "FIL" if ":" in component else "TRK",
+                "measures": [
+                    {"metric": m, "value": measures[m]}
+                    for m in metrics
+                    if m in measures
+                ],
+            }
+        }
+
+    def _measures_component_tree(self, parameters):
+        component = parameters.get("component", "")
+        if component not in self.data.version_files:
+            return _not_found(component)
+        metrics = [m for m in parameters.get("metricKeys", "").split(",") if m]
+        files = list(self.data.version_files[component].items())
+        status, page, paging = _page(files, parameters)
+        if status != 200:
+            return status, _cap_error(paging)
+        return 200, {
+            "paging": paging,
+            "baseComponent": {"key": component, "qualifier": "TRK"},
+            "components": [
+                {
+                    "key": key,
+                    "qualifier": "FIL",
+                    "measures": [
+                        {"metric": m, "value": measures[m]}
+                        for m in metrics
+                        if m in measures
+                    ],
+                }
+                for key, measures in page
+            ],
+        }
+
+    def _components_tree(self, parameters):
+        component = parameters.get("component", "")
+        if component not in self.data.version_files:
+            return _not_found(component)
+        keys = list(self.data.version_files[component])
+        status, page, paging = _page(keys, parameters)
+        if status != 200:
+            return status, _cap_error(paging)
+        return 200, {
+            "paging": paging,
+            "baseComponent": {"key": component, "qualifier": "TRK"},
+            "components": [{"key": key, "qualifier": "FIL"} for key in page],
+        }
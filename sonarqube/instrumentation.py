@@ -0,0 +1,338 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+"""
+    Run metrics of the SonarQube layer and the reports.
+        API calls - per (server, endpoint): calls, cache hits, errors, retries, response bytes and a latency histogram
+        Stages    - per report step: number of runs and total wall time
+    Metrics are kept per process; dump them at the end of a run with Metrics.write_json or Metrics.write_prometheus.
+    Worker processes hand their API call and stage metrics back with Metrics.drain, the parent adds them with
+    Metrics.merge (gauges describe the state of one process and are not merged).
+"""
+
+# Upper bounds (seconds) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _EndpointStats:
+    __slots__ = (
+        "calls",
+        "cache_hits",
+        "errors",
+        "retries",
+        "response_bytes",
+        "latency_sum",
+        "latency_buckets",
+        "status",
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.retries = 0
+        self.response_bytes = 0
+        self.latency_sum = 0.0
+        # Non-cumulative counts, one more than LATENCY_BUCKETS for the unbounded bucket
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        # Dictionary of (<HTTP status code>, <count>) entries
+        self.status = {}
+
+    def summary(self):
+        cumulative = []
+        count = 0
+        for bucket_count in self.latency_buckets:
+            count += bucket_count
+            cumulative.append(count)
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "retries": self.retries,
+            "response_bytes": self.response_bytes,
+            "latency_seconds_sum": self.latency_sum,
+            "latency_seconds_buckets": dict(
+                zip([str(le) for le in LATENCY_BUCKETS] + ["+Inf"], cumulative)
+            ),
+            "status": {str(code): n for code, n in sorted(self.status.items())},
+        }
+
+
+def _bucket(seconds):
+    for index in range(len(LATENCY_BUCKETS)):
+        if seconds <= LATENCY_BUCKETS[index]:
+            return index
+    return len(LATENCY_BUCKETS)
+
+
+def _prometheus_labels(labels):
+    return (
+        "{"
+        + ",".join(
+            key
+            + '="'
+            + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            + '"'
+            for key, value in labels
+        )
+        + "}"
+    )
+
+
+class Metrics:
+    """
+    Thread-safe registry of API call and stage metrics
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Dictionary of ((<server>, <endpoint>), _EndpointStats) entries
+        self._endpoints = {}
+        # Dictionary of (<stage>, [<runs>, <seconds>]) entries
+        self._stages = {}
+        # Dictionary of ((<name>, <labels tuple>), <value>) entries
+        self._gauges = {}
+
+    def _endpoint(self, server, endpoint):
+        key = (server, endpoint)
+        stats = self._endpoints.get(key)
+        if stats is None:
+            stats = self._endpoints[key] = _EndpointStats()
+        return stats
+
+    def record_call(self, server, endpoint, seconds, status, response_bytes, retries):
+        """
+        Record an API call that returned a response
+        params:
+            seconds        - Wall time of the call, including retries
+            status         - HTTP status code of the final response
+            response_bytes - Size of the response body
+            retries        - Number of retries before the final response
+        """
+        with self._lock:
+            stats = self._endpoint(server, endpoint)
+            stats.calls += 1
+            stats.retries += retries
+            stats.response_bytes += response_bytes
+            stats.latency_sum += seconds
+            stats.latency_buckets[_bucket(seconds)] += 1
+            stats.status[status] = stats.status.get(status, 0) + 1
+            if status >= 400:
+                stats.errors += 1
+
+    def record_error(self, server, endpoint, seconds):
+        """
+        Record an API call that failed without a response (e.g. retries exhausted on connection errors)
+        """
+        with self._lock:
+            stats = self._endpoint(server, endpoint)
+            stats.calls += 1
+            stats.errors += 1
+            stats.latency_sum += seconds
+            stats.latency_buckets[_bucket(seconds)] += 1
+
+    def record_cache_hit(self, server, endpoint):
+        """
+        Record an API call answered by the response cache
+        """
+        with self._lock:
+            self._endpoint(server, endpoint).cache_hits += 1
+
+    def set_gauge(self, name, labels, value):
+        """
+        params:
+            name   - Gauge name (e.g. "concurrency_limit")
+            labels - Tuple of (<label>, <value>) pairs
+        """
+        with self._lock:
+            self._gauges[(name, tuple(labels))] = value
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a report step
+        e.g. with metrics.stage("issues"): ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                stage = self._stages.setdefault(name, [0, 0.0])
+                stage[0] += 1
+                stage[1] += seconds
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+            self._stages = {}
+            self._gauges = {}
+
+    def drain(self):
+        """
+        Take the API call and stage metrics recorded since the last drain (gauges are kept)
+        output:
+            Picklable (<endpoints>, <stages>) tuple, see @merge
+        """
+        with self._lock:
+            drained = (self._endpoints, self._stages)
+            self._endpoints = {}
+            self._stages = {}
+        return drained
+
+    def merge(self, drained):
+        """
+        Add the metrics drained from another registry (e.g. in a worker process)
+        params:
+            drained - Result of @drain
+        """
+        endpoints, stages = drained
+        with self._lock:
+            for (server, endpoint), other in endpoints.items():
+                stats = self._endpoint(server, endpoint)
+                stats.calls += other.calls
+                stats.cache_hits += other.cache_hits
+                stats.errors += other.errors
+                stats.retries += other.retries
+                stats.response_bytes += other.response_bytes
+                stats.latency_sum += other.latency_sum
+                for index in range(len(stats.latency_buckets)):
+                    stats.latency_buckets[index] += other.latency_buckets[index]
+                for status, count in other.status.items():
+                    stats.status[status] = stats.status.get(status, 0) + count
+            for name, (runs, seconds) in stages.items():
+                stage = self._stages.setdefault(name, [0, 0.0])
+                stage[0] += runs
+                stage[1] += seconds
+
+    def summary(self):
+        """
+        output:
+            Dictionary with "servers" ({<server>: {<endpoint>: {<metric>: <value>}}}), "stages"
+            ({<stage>: {"runs": .., "seconds": ..}}) and "gauges" ({<name>: [{"labels": .., "value": ..}]})
+        """
+        with self._lock:
+            servers = {}
+            for (server, endpoint), stats in sorted(self._endpoints.items()):
+                servers.setdefault(server, {})[endpoint] = stats.summary()
+            stages = {
+                name: {"runs": runs, "seconds": seconds}
+                for name, (runs, seconds) in self._stages.items()
+            }
+            gauges = {}
+            for (name, labels), value in sorted(self._gauges.items()):
+                gauges.setdefault(name, []).append(
+                    {"labels": dict(labels), "value": value}
+                )
+        return {"servers": servers, "stages": stages, "gauges": gauges}
+
+    def write_json(self, path):
+        """
+        Dump @summary to a JSON file
+        """
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def prometheus_text(self):
+        """
+        output:
+            Metrics in the Prometheus text exposition format
+        """
+        summary = self.summary()
+        lines = []
+
+        def counter(name, help_text, key):
+            lines.append("# HELP sonarqube_api_" + name + " " + help_text)
+            lines.append("# TYPE sonarqube_api_" + name + " counter")
+            for server, endpoints in summary["servers"].items():
+                for endpoint, stats in endpoints.items():
+                    labels = _prometheus_labels(
+                        [("server", server), ("endpoint", endpoint)]
+                    )
+                    lines.append(
+                        "sonarqube_api_" + name + labels + " " + str(stats[key])
+                    )
+
+        counter("calls_total", "API calls sent to the server", "calls")
+        counter("cache_hits_total", "API calls answered by the cache", "cache_hits")
+        counter("errors_total", "API calls without a 2xx/3xx response", "errors")
+        counter("retries_total", "Retries of API calls", "retries")
+        counter("response_bytes_total", "Response body bytes", "response_bytes")
+
+        name = "sonarqube_api_request_duration_seconds"
+        lines.append("# HELP " + name + " Wall time of API calls, including retries")
+        lines.append("# TYPE " + name + " histogram")
+        for server, endpoints in summary["servers"].items():
+            for endpoint, stats in endpoints.items():
+                labels = [("server", server), ("endpoint", endpoint)]
+                for le, count in stats["latency_seconds_buckets"].items():
+                    lines.append(
+                        name
+                        + "_bucket"
+                        + _prometheus_labels(labels + [("le", le)])
+                        + " "
+                        + str(count)
+                    )
+                lines.append(
+                    name
+                    + "_sum"
+                    + _prometheus_labels(labels)
+                    + " "
+                    + repr(stats["latency_seconds_sum"])
+                )
+                lines.append(
+                    name
+                    + "_count"
+                    + _prometheus_labels(labels)
+                    + " "
+                    + str(stats["latency_seconds_buckets"]["+Inf"])
+                )
+
+        lines.append("# HELP sonarqube_stage_seconds_total Wall time of report stages")
+        lines.append("# TYPE sonarqube_stage_seconds_total counter")
+        for stage, stats in summary["stages"].items():
+            lines.append(
+                "sonarqube_stage_seconds_total"
+                + _prometheus_labels([("stage", stage)])
+                + " "
+                + repr(stats["seconds"])
+            )
+        lines.append("# HELP sonarqube_stage_runs_total Runs of report stages")
+        lines.append("# TYPE sonarqube_stage_runs_total counter")
+        for stage, stats in summary["stages"].items():
+            lines.append(
+                "sonarqube_stage_runs_total"
+                + _prometheus_labels([("stage", stage)])
+                + " "
+                + str(stats["runs"])
+            )
+
+        for gauge, values in summary["gauges"].items():
+            lines.append("# TYPE sonarqube_" + gauge + " gauge")
+            for entry in values:
+                lines.append(
+                    "sonarqube_"
+                    + gauge
+                    + _prometheus_labels(entry["labels"].items())
+                    + " "
+                    + repr(entry["value"])
+                )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Dump the metrics as a Prometheus textfile (e.g. for the node exporter textfile collector)
+        The file is replaced atomically, so a collector never reads a partial file
+        """
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(temporary_path, path)
+
+
+# Registry used by sonar_qube_api and the reports
+metrics = Metrics()
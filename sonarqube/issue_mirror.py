@@ -0,0 +1,245 @@
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sonar_qube_api import (
+    ISSUES_SEARCH_RESULT_CAP,
+    ProjectCatalog,
+    _fetch_issues_search_windows,
+    _issues_search_filters,
+    _paginate,
+    _project_issues,
+    _project_issues_search_window,
+    _sonar_qube_api_call,
+    json_loads,
+    logger,
+)
+
+"""
+    Local mirror of SonarQube issues.
+    The first sync of a project downloads all its issues; later syncs only fetch the issues created or updated
+    since the project's watermark and upsert them by issue key.
+"""
+
+
+def _sq_datetime(sq_datetime):
+    """
+    Convert SonarQube date/time string to a timezone-aware Python datetime
+    """
+    return datetime.strptime(sq_datetime, "%Y-%m-%dT%H:%M:%S%z")
+
+
+class IssueMirror:
+    """
+    SQLite mirror of the issues of all projects, for one set of issue filters
+    Per project watermark:
+        last_analysis_date - date of the latest project analysis seen in the last sync
+        last_update        - latest issue updateDate seen in the last sync
+    """
+
+    def __init__(
+        self,
+        path="sonarqube_issues.sqlite",
+        languages=["java"],
+        resolutions=[],
+        types=["CODE_SMELL", "BUG", "VULNERABILITY"],
+    ):
+        """
+        params:
+            path        - SQLite database file
+            languages   - List of languages to mirror issues for
+            resolutions - List of issue resolutions to mirror
+            types       - List of issue types to mirror
+        """
+        self.path = path
+        self.filters = _issues_search_filters(languages, resolutions, types)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS issues ("
+            "key TEXT PRIMARY KEY, project TEXT, creation_date TEXT, update_date TEXT, json TEXT)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS issues_project ON issues (project, creation_date, key)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            "project TEXT PRIMARY KEY, last_analysis_date TEXT, last_update TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)"
+        )
+
+        # A mirror holds the issues of one filter set only
+        filters = json.dumps(self.filters, sort_keys=True)
+        row = self._db.execute(
+            "SELECT value FROM settings WHERE name = 'filters'"
+        ).fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO settings VALUES ('filters', ?)", (filters,))
+        elif row[0] != filters:
+            raise RuntimeError(
+                "Mirror " + path + " holds issues for different filters: " + row[0]
+            )
+        self._db.commit()
+
+    def watermark(self, project):
+        """
+        output:
+            (last_analysis_date, last_update) tuple of ISO strings, None if the project was never synced
+        """
+        return self._db.execute(
+            "SELECT last_analysis_date, last_update FROM watermarks WHERE project = ?",
+            (project,),
+        ).fetchone()
+
+    def _upsert(self, project, raw_issues):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    issue["key"],
+                    project,
+                    issue["creationDate"],
+                    issue.get("updateDate", issue["creationDate"]),
+                    json.dumps(issue),
+                )
+                for issue in raw_issues
+            ],
+        )
+
+    def _fetch_all(self, project, analyses, call_map):
+        """
+        All issues of a project, using the same query windows as @api_issues_search
+        """
+        window = _project_issues_search_window(project, analyses, self.filters)
+        if window is None:
+            return []
+        _, window_pages = _fetch_issues_search_windows([window], call_map)
+        raw_issues = []
+        for pages in window_pages:
+            for partial_result in pages:
+                raw_issues.extend(partial_result["issues"])
+        return raw_issues
+
+    def _fetch_updated(self, project, last_update):
+        """
+        Issues of a project updated at or after last_update, most recently updated first
+        output:
+            List of issue dictionaries, None if there are too many to be returned by one query
+        """
+        ISSUES_SEARCH = "/api/issues/search"
+        parameters = dict(self.filters)
+        parameters["components"] = project
+        parameters["s"] = "UPDATE_DATE"
+        parameters["asc"] = "false"
+        watermark = _sq_datetime(last_update)
+
+        # Pages are only fetched until the watermark is reached
+        # The same parameters return newer issues on every sync, so responses must not be cached
+        raw_issues = []
+        for issue in _paginate(
+            lambda path, page_parameters: _sonar_qube_api_call(
+                path, page_parameters, use_cache=False
+            ),
+            ISSUES_SEARCH,
+            parameters,
+            "issues",
+            result_cap=ISSUES_SEARCH_RESULT_CAP,
+        ):
+            update_date = issue.get("updateDate", issue["creationDate"])
+            if _sq_datetime(update_date) < watermark:
+                return raw_issues
+            raw_issues.append(issue)
+
+        if len(raw_issues) >= ISSUES_SEARCH_RESULT_CAP:
+            return None
+        return raw_issues
+
+    def sync(self, catalog=None, max_concurrency=1):
+        """
+        Bring the mirror up to date with the HISTORY server
+        Projects without a new analysis since the last sync are skipped. Otherwise only issues created or updated
+        since the project's watermark are fetched (all issues on the first sync, or if too many were updated).
+        params:
+            catalog         - ProjectCatalog to reuse (projects and analyses are fetched if None)
+            max_concurrency - Maximum number of API calls in flight for full project syncs
+        """
+        if catalog is None:
+            catalog = ProjectCatalog()
+        catalog.load(max_concurrency)
+
+        executor = (
+            ThreadPoolExecutor(max_workers=max_concurrency)
+            if max_concurrency > 1
+            else None
+        )
+        call_map = executor.map if executor is not None else map
+        try:
+            for project in catalog.projects():
+                analyses = catalog.analyses(project)
+                if len(analyses) == 0:
+                    continue
+                last_analysis_date = str(analyses[-1].date)
+                watermark = self.watermark(project)
+
+                if watermark is not None and watermark[0] >= last_analysis_date:
+                    logger.debug("Mirror up to date - %s", project)
+                    continue
+
+                raw_issues = None
+                if watermark is not None and watermark[1] is not None:
+                    raw_issues = self._fetch_updated(project, watermark[1])
+                if raw_issues is None:
+                    logger.debug("Mirror full sync - %s", project)
+                    raw_issues = self._fetch_all(project, analyses, call_map)
+                    self._db.execute("DELETE FROM issues WHERE project = ?", (project,))
+                else:
+                    logger.debug(
+                        "Mirror incremental sync - %s - %d issues",
+                        project,
+                        len(raw_issues),
+                    )
+                self._upsert(project, raw_issues)
+
+                # Latest update of the project's mirrored issues
+                row = self._db.execute(
+                    "SELECT update_date FROM issues WHERE project = ?", (project,)
+                ).fetchall()
+                last_update = max(
+                    (update_date for (update_date,) in row),
+                    key=_sq_datetime,
+                    default=None,
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)",
+                    (project, last_analysis_date, last_update),
+                )
+                self._db.commit()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def issues(self, catalog=None):
+        """
+        Read issues from the mirror instead of the live server (same result as @api_issues_search)
+        params:
+            catalog - ProjectCatalog used to calculate issue lifetime (projects and analyses are fetched if None)
+        output:
+            List of Issue instances, ordered by project, creation date and key
+        """
+        if catalog is None:
+            catalog = ProjectCatalog()
+
+        result = []
+        for project in catalog.projects():
+            rows = self._db.execute(
+                "SELECT json FROM issues WHERE project = ? ORDER BY creation_date, key",
+                (project,),
+            ).fetchall()
+            raw_issues = [json_loads(row[0]) for row in rows]
+            result.extend(_project_issues(raw_issues, catalog.analyses(project)))
+        return result
+
+    def close(self):
+        self._db.close()
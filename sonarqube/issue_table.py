@@ -0,0 +1,350 @@
+import numpy as np
+
+from sonar_qube_api import (
+    Severity,
+    Type,
+    Resolution,
+    SEVERITY_BY_NAME,
+    TYPE_BY_NAME,
+    sq_datetime_to_date,
+    sq_duration_to_minutes,
+)
+
+"""
+    Columnar representation of SonarQube issues.
+    Issue fields are stored as NumPy arrays, so per-analysis aggregations run as vectorized operations
+    instead of loops over Issue instances.
+"""
+
+# Closing date of issues that are still open
+MAX_DATE = np.datetime64("9999-12-31", "D")
+# Code of issues without a resolution
+NO_RESOLUTION = -1
+
+
+class _Dictionary:
+    """
+    Dictionary encoding of a string column: each distinct value gets the next integer code
+    """
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """
+        Code of the given value, or -1 if the value does not appear in the column
+        """
+        return self._codes.get(value, -1)
+
+
+def _first_appearance_order(codes):
+    """
+    Distinct codes, in the order in which they first appear
+    """
+    unique_codes, first_index = np.unique(codes, return_index=True)
+    return unique_codes[np.argsort(first_index, kind="stable")]
+
+
+def _json_row(json_data):
+    """
+    Decode the IssueTable fields of one issue dictionary, using the same rules as Issue
+    """
+    component = json_data["component"]
+    column_index = component.index(":")
+    return (
+        json_data["key"],
+        sq_datetime_to_date(json_data["creationDate"]),
+        (
+            sq_datetime_to_date(json_data["closeDate"])
+            if "closeDate" in json_data
+            else None
+        ),
+        sq_duration_to_minutes(json_data["debt"]) if "debt" in json_data else "n/a",
+        SEVERITY_BY_NAME[json_data["severity"]].value,
+        TYPE_BY_NAME[json_data["type"]].value,
+        (
+            Resolution[json_data["resolution"]].value
+            if "resolution" in json_data
+            else NO_RESOLUTION
+        ),
+        component[:column_index],
+        component[column_index + 1 :],
+        json_data["rule"],
+        json_data["tags"],
+    )
+
+
+class IssueTable:
+    """
+    Issues stored column-wise:
+        creation_date, close_date - datetime64[D] (close_date is NaT for open issues,
+                                    close_date_or_max is MAX_DATE for them)
+        debt                      - int32 minutes, debt_missing marks issues with "n/a" debt (stored as 0)
+        severity, type            - Severity / Type enum values (int8)
+        resolution                - Resolution enum value, NO_RESOLUTION if not resolved (int8)
+        project, component, rule  - dictionary-encoded int32 columns
+        tags                      - dictionary-encoded int32 codes of all issue tags, issue i has tags
+                                    tag_codes[tag_offsets[i]:tag_offsets[i + 1]]
+    Issues are also indexed by project and creation date: the issues of project p, sorted by creation date, are
+    project_order[project_offsets[p]:project_offsets[p + 1]] (their creation dates are in sorted_creation_date)
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.projects = _Dictionary()
+        self.components = _Dictionary()
+        self.rules = _Dictionary()
+        self.tags = _Dictionary()
+
+    @classmethod
+    def from_issues(cls, issues):
+        """
+        Build the table from a list of Issue instances (e.g. returned by @api_issues_search)
+        """
+        return cls._from_rows(
+            len(issues),
+            (
+                (
+                    issue.key,
+                    issue.creationDate,
+                    issue.closeDate,
+                    issue.debt,
+                    issue.severity.value,
+                    issue.type.value,
+                    (
+                        issue.resolution.value
+                        if issue.resolution is not None
+                        else NO_RESOLUTION
+                    ),
+                    issue.project,
+                    issue.component,
+                    issue.rule,
+                    issue.tags,
+                )
+                for issue in issues
+            ),
+        )
+
+    @classmethod
+    def from_json(cls, raw_issues):
+        """
+        Build the table directly from issue dictionaries as returned by /api/issues/search,
+        without creating Issue instances
+        """
+        return cls._from_rows(
+            len(raw_issues), (_json_row(json_data) for json_data in raw_issues)
+        )
+
+    @classmethod
+    def _from_rows(cls, issue_count, rows):
+        """
+        params:
+            issue_count - number of rows
+            rows        - iterable of (key, creation date, close date, debt, severity, type, resolution,
+                          project, component, rule, tags) tuples
+        """
+        table = cls()
+        creation_dates = []
+        close_dates = []
+        table.debt = np.zeros(issue_count, dtype=np.int32)
+        table.debt_missing = np.zeros(issue_count, dtype=bool)
+        table.severity = np.empty(issue_count, dtype=np.int8)
+        table.type = np.empty(issue_count, dtype=np.int8)
+        table.resolution = np.empty(issue_count, dtype=np.int8)
+        table.project = np.empty(issue_count, dtype=np.int32)
+        table.component = np.empty(issue_count, dtype=np.int32)
+        table.rule = np.empty(issue_count, dtype=np.int32)
+        table.tag_offsets = np.zeros(issue_count + 1, dtype=np.int32)
+        tag_codes = []
+
+        index = 0
+        for (
+            key,
+            creation_date,
+            close_date,
+            debt,
+            severity,
+            issue_type,
+            resolution,
+            project,
+            component,
+            rule,
+            tags,
+        ) in rows:
+            table.keys.append(key)
+            creation_dates.append(creation_date)
+            close_dates.append(close_date)
+            if debt == "n/a":
+                table.debt_missing[index] = True
+            else:
+                table.debt[index] = debt
+            table.severity[index] = severity
+            table.type[index] = issue_type
+            table.resolution[index] = resolution
+            table.project[index] = table.projects.encode(project)
+            table.component[index] = table.components.encode(component)
+            table.rule[index] = table.rules.encode(rule)
+            for tag in tags:
+                tag_codes.append(table.tags.encode(tag))
+            table.tag_offsets[index + 1] = len(tag_codes)
+            index += 1
+        assert index == issue_count
+
+        # None is converted to NaT
+        table.creation_date = np.array(creation_dates, dtype="datetime64[D]")
+        table.close_date = np.array(close_dates, dtype="datetime64[D]")
+        table.close_date_or_max = np.where(
+            np.isnat(table.close_date), MAX_DATE, table.close_date
+        )
+        table.tag_codes = np.array(tag_codes, dtype=np.int32)
+        # Issue index of each tag entry
+        table.tag_issue = np.repeat(
+            np.arange(issue_count, dtype=np.int32), np.diff(table.tag_offsets)
+        )
+        # Sorted by project, then by creation date
+        table.project_order = np.lexsort((table.creation_date, table.project))
+        table.sorted_creation_date = table.creation_date[table.project_order]
+        table.project_offsets = np.searchsorted(
+            table.project[table.project_order],
+            np.arange(len(table.projects.values) + 1),
+        )
+        return table
+
+    def __len__(self):
+        return len(self.keys)
+
+    def analysis_mask(self, analysis, include_fixed=True):
+        """
+        Issues assigned to a project analysis: OPEN at the time of analysis (includes issues CREATED during the analysis)
+        or CLOSED during that analysis
+        params:
+            analysis      - ProjectAnalysis instance
+            include_fixed - also select the issues CLOSED during the analysis
+        output:
+            Boolean mask over the issues
+        """
+        analysis_date = np.datetime64(analysis.date, "D")
+        mask = np.zeros(len(self), dtype=bool)
+        project = self.projects.code(analysis.project)
+        if project == -1:
+            return mask
+        # Only the issues of the project CREATED up to the analysis date are checked, found by binary search
+        start = self.project_offsets[project]
+        end = start + np.searchsorted(
+            self.sorted_creation_date[start : self.project_offsets[project + 1]],
+            analysis_date,
+            side="right",
+        )
+        candidates = self.project_order[start:end]
+        close_date = self.close_date_or_max[candidates]
+        selected = analysis_date <= close_date
+        if not include_fixed:
+            selected &= close_date != analysis_date
+        mask[candidates[selected]] = True
+        return mask
+
+    def technical_debt(self, analysis):
+        """
+        Technical debt of a project analysis
+        output:
+            (<new debt>, <existing debt>, <fixed debt>) tuple
+            <total technical debt> = <new debt> + <existing debt>
+            <fixed technical debt> = issues marked as 'FIXED' during the analysis
+        """
+        analysis_date = np.datetime64(analysis.date, "D")
+        mask = self.analysis_mask(analysis)
+        assert not np.any(mask & (self.creation_date == self.close_date))
+
+        new = mask & (self.creation_date == analysis_date)
+        fixed = mask & ~new & (self.close_date == analysis_date)
+        existing = mask & ~new & ~fixed
+        return (
+            int(self.debt[new].sum(dtype=np.int64)),
+            int(self.debt[existing].sum(dtype=np.int64)),
+            int(self.debt[fixed].sum(dtype=np.int64)),
+        )
+
+    def _debt_by(self, codes, dictionary, mask):
+        """
+        Sum issue debt by the values of a dictionary-encoded column
+        output:
+            Dictionary of (<value>, <debt>) entries, in order of first appearance
+        """
+        selected = codes[mask]
+        sums = np.bincount(
+            selected, weights=self.debt[mask], minlength=len(dictionary.values)
+        )
+        return {
+            dictionary.values[code]: int(sums[code])
+            for code in _first_appearance_order(selected)
+        }
+
+    def debt_by_rule(self, mask):
+        """
+        output:
+            Dictionary of (<rule>, <debt>) entries for the selected issues, in order of first appearance
+        """
+        return self._debt_by(self.rule, self.rules, mask)
+
+    def debt_by_tag(self, mask):
+        """
+        Issue debt is split evenly between the issue's tags
+        output:
+            Dictionary of (<tag>, <debt>) entries for the selected issues, in order of first appearance
+        """
+        tag_mask = mask[self.tag_issue]
+        tag_issue = self.tag_issue[tag_mask]
+        selected = self.tag_codes[tag_mask]
+        tag_count = np.diff(self.tag_offsets)[tag_issue]
+        # bincount adds the weights in input order, so the floating point sums match a loop over the issues
+        sums = np.bincount(
+            selected,
+            weights=self.debt[tag_issue] / tag_count,
+            minlength=len(self.tags.values),
+        )
+        return {
+            self.tags.values[code]: float(sums[code])
+            for code in _first_appearance_order(selected)
+        }
+
+    def debt_by_component(self, mask):
+        """
+        Technical debt of each component, broken down by issue severity and type
+        output:
+            Dictionary of (<component>, {"TD": .., "BUG": .., "CODE_SMELL": .., "VULNERABILITY": ..,
+            "BLOCKER": .., "CRITICAL": .., "MAJOR": .., "MINOR": .., "INFO": ..}) entries
+            for the selected issues, in order of first appearance
+        """
+        selected = self.component[mask]
+        debt = self.debt[mask]
+        component_count = len(self.components.values)
+        total = np.bincount(selected, weights=debt, minlength=component_count)
+        by_severity = np.bincount(
+            selected * len(Severity) + self.severity[mask],
+            weights=debt,
+            minlength=component_count * len(Severity),
+        ).reshape(component_count, len(Severity))
+        by_type = np.bincount(
+            selected * len(Type) + self.type[mask],
+            weights=debt,
+            minlength=component_count * len(Type),
+        ).reshape(component_count, len(Type))
+
+        result = {}
+        for code in _first_appearance_order(selected):
+            component_td = {"TD": int(total[code])}
+            for issue_type in Type:
+                component_td[str(issue_type)] = int(by_type[code][issue_type.value])
+            for severity in Severity:
+                component_td[str(severity)] = int(by_severity[code][severity.value])
+            result[self.components.values[code]] = component_td
+        return result
@@ -0,0 +1,259 @@
+import csv
+import os
+
+import xlsxwriter
+
+# pyarrow is optional, it is only needed for Parquet output
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+"""
+    Pluggable output backends for the analysis reports.
+    A report is made of tables; every table is written row by row.
+        XlsxOutput    - one workbook per report, one sheet per table (the original output)
+        CsvOutput     - one CSV file per table, in a directory per report
+        ParquetOutput - one Parquet file per table, in a directory per report
+    CSV and Parquet tables are partitioned by project and version, Hive style
+    (e.g. <report>/<table>/project=FreeMind/version=0.9.0/part-0.csv), so a report directory
+    can be loaded as one dataset by pandas or DuckDB.
+    Sheets laid out for reading (a column per version, formulas, blank separator rows) are only written by
+    spreadsheet backends (spreadsheet = True); reports write the same data as long-form tables to the others.
+"""
+
+
+def _partition_suffix(partition):
+    if not partition:
+        return ""
+    return "_" + "_".join(str(value) for value in partition.values())
+
+
+def _partition_path(partition):
+    if not partition:
+        return ""
+    return os.path.join(*(str(k) + "=" + str(v) for k, v in partition.items()))
+
+
+class XlsxOutput:
+    """
+    XLSX workbooks, the partition values of a report are appended to its file name
+    (e.g. 'Package_TechnicalDebt_History_FreeMind.xlsx')
+    """
+
+    spreadsheet = True
+
+    def __init__(self, directory=".", constant_memory=False):
+        """
+        params:
+            directory       - Output directory
+            constant_memory - Flush each row to disk once written, caps memory use for large reports
+        """
+        self.directory = directory
+        self.constant_memory = constant_memory
+
+    def open(self, report, partition=None):
+        """
+        params:
+            report    - Report name, relative to the output directory
+            partition - Dictionary of (<partition column>, <value>) entries common to all report tables
+        """
+        return _XlsxReport(
+            os.path.join(
+                self.directory, report + _partition_suffix(partition) + ".xlsx"
+            ),
+            self.constant_memory,
+        )
+
+
+class _XlsxReport:
+    def __init__(self, path, constant_memory):
+        self.path = path
+        self._book = xlsxwriter.Workbook(path, {"constant_memory": constant_memory})
+        self._header_cell_format = self._book.add_format(
+            {"bold": True, "center_across": True, "bg_color": "#FFFFCC"}
+        )
+        # Dictionary of (<sheet name>, <XlsxTable written last on the sheet>) entries
+        self._sheets = {}
+
+    def table(
+        self,
+        name,
+        columns,
+        sheet=None,
+        partition=None,
+        sheet_header=None,
+        header_style=False,
+        column_widths=None,
+        skip_rows=0,
+    ):
+        """
+        params:
+            name          - Table name (the sheet name if sheet is None)
+            columns       - Column names
+            sheet         - Sheet name. A table on the sheet of a previous table is placed below it
+            partition     - Ignored, sheets are not partitioned
+            sheet_header  - Header row written to the sheet, defaults to columns
+            header_style  - Bold header on a yellow background
+            column_widths - Dictionary of (<column index>, <width>) entries
+            skip_rows     - Blank rows before the header
+        """
+        if sheet is None:
+            sheet = name
+        if sheet in self._sheets:
+            worksheet = self._sheets[sheet].worksheet
+            row = self._sheets[sheet].row
+        else:
+            worksheet = self._book.add_worksheet(sheet)
+            row = 0
+        for column, width in (column_widths or {}).items():
+            worksheet.set_column(column, column, width)
+
+        table = _XlsxTable(worksheet, row + skip_rows)
+        table.write_row(
+            columns if sheet_header is None else sheet_header,
+            self._header_cell_format if header_style else None,
+        )
+        self._sheets[sheet] = table
+        return table
+
+    def close(self):
+        self._book.close()
+
+
+class _XlsxTable:
+    def __init__(self, worksheet, row):
+        self.worksheet = worksheet
+        self.row = row
+
+    def write_row(self, values, cell_format=None):
+        """
+        Write the next row, None leaves a cell empty
+        """
+        self.worksheet.write_row(self.row, 0, values, cell_format)
+        self.row += 1
+
+    def skip_row(self):
+        """
+        Leave a blank row (only sheets have blank rows)
+        """
+        self.row += 1
+
+
+class CsvOutput:
+    """
+    CSV datasets, one directory per report
+    """
+
+    spreadsheet = False
+
+    def __init__(self, directory="."):
+        self.directory = directory
+
+    def open(self, report, partition=None):
+        return _ColumnarReport(
+            os.path.join(self.directory, report), partition, _CsvTable
+        )
+
+
+class ParquetOutput:
+    """
+    Parquet datasets, one directory per report. Requires pyarrow
+    Column types are inferred; "n/a" cells are stored as nulls and columns of mixed types as strings
+    """
+
+    spreadsheet = False
+
+    def __init__(self, directory="."):
+        if pyarrow is None:
+            raise RuntimeError("Parquet output requires pyarrow")
+        self.directory = directory
+
+    def open(self, report, partition=None):
+        return _ColumnarReport(
+            os.path.join(self.directory, report), partition, _ParquetTable
+        )
+
+
+class _ColumnarReport:
+    def __init__(self, path, partition, table_class):
+        self.path = path
+        self.partition = dict(partition or {})
+        self._table_class = table_class
+        self._tables = []
+
+    def table(self, name, columns, sheet=None, partition=None, **sheet_options):
+        """
+        Same parameters as the XLSX report; sheet layout options are ignored
+        """
+        table_partition = dict(self.partition)
+        table_partition.update(partition or {})
+        directory = os.path.join(self.path, name, _partition_path(table_partition))
+        os.makedirs(directory, exist_ok=True)
+        table = self._table_class(directory, columns)
+        self._tables.append(table)
+        return table
+
+    def close(self):
+        for table in self._tables:
+            table.close()
+
+
+class _CsvTable:
+    def __init__(self, directory, columns):
+        self._file = open(
+            os.path.join(directory, "part-0.csv"), "w", newline="", encoding="utf-8"
+        )
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write_row(self, values, cell_format=None):
+        self._writer.writerow(values)
+
+    def skip_row(self):
+        pass
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetTable:
+    def __init__(self, directory, columns):
+        self.path = os.path.join(directory, "part-0.parquet")
+        self.columns = [str(column) for column in columns]
+        self._rows = []
+
+    def write_row(self, values, cell_format=None):
+        self._rows.append(values)
+
+    def skip_row(self):
+        pass
+
+    def close(self):
+        arrays = []
+        for index in range(len(self.columns)):
+            # "n/a" marks missing values on sheets, here they are nulls
+            values = [
+                row[index] if index < len(row) and row[index] != "n/a" else None
+                for row in self._rows
+            ]
+            try:
+                arrays.append(pyarrow.array(values))
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                # Mixed value types (e.g. "n/a" LOC) are stored as strings
+                arrays.append(
+                    pyarrow.array(
+                        [None if value is None else str(value) for value in values]
+                    )
+                )
+        pyarrow.parquet.write_table(
+            pyarrow.Table.from_arrays(arrays, names=self.columns), self.path
+        )
+        self._rows = []
+
+
+"""
+    Output backends by format name
+"""
+OUTPUT_FORMATS = {"xlsx": XlsxOutput, "csv": CsvOutput, "parquet": ParquetOutput}
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+"""
+    Persistent SonarQube response cache.
+    Historical analyses (HISTORY server) and per-version projects (SINGLE server) do not change once
+    analysed, so their API responses are stored on disk and reused across runs.
+"""
+
+"""
+    Time to live (seconds) of cached responses, by API endpoint. None means the response never expires.
+    Endpoints that are not listed use DEFAULT_TTL.
+"""
+DEFAULT_TTL = None
+ENDPOINT_TTL = {
+    # New projects and analyses can be added to the servers
+    "/api/projects/search": 24 * 3600,
+    "/api/project_analyses/search": 24 * 3600,
+    # Every new analysis adds a point to the history, so it expires with the analysis list
+    "/api/measures/search_history": 24 * 3600,
+    "/api/metrics/search": 7 * 24 * 3600,
+}
+
+
+class CacheMiss(RuntimeError):
+    """
+    Raised in replay only mode when a response is not cached
+    """
+
+    pass
+
+
+def cache_key(server_url, path, parameters):
+    """
+    Content address of an API call
+    params:
+        server_url - URL of SonarQube server
+        path       - the GET path (e.g. '/api/projects/search')
+        parameters - dict of call parameters
+    output:
+        SHA-256 hex digest of server, path and sorted parameters
+    """
+    canonical = json.dumps(
+        [server_url, path, sorted((str(k), str(v)) for k, v in parameters.items())],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of SonarQube API responses, keyed by server + path + sorted parameters
+    """
+
+    def __init__(
+        self, path="sonarqube_cache.sqlite", replay_only=False, endpoint_ttl=None
+    ):
+        """
+        params:
+            path         - SQLite database file
+            replay_only  - never contact the servers; a missing response raises CacheMiss
+            endpoint_ttl - dict of path -> TTL in seconds (None = never expires), overrides ENDPOINT_TTL
+        """
+        self.path = path
+        self.replay_only = replay_only
+        self.endpoint_ttl = dict(ENDPOINT_TTL)
+        if endpoint_ttl is not None:
+            self.endpoint_ttl.update(endpoint_ttl)
+        self._connect()
+
+    def _connect(self):
+        # Responses are stored from the issue search worker threads as well
+        self._lock = threading.Lock()
+        # A connection must not be used across fork, report worker processes open their own
+        self._pid = os.getpid()
+        # Several processes may write at once, wait for their commits instead of failing
+        self._db = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        # One commit per stored response, so avoid a full fsync each time
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, server TEXT, path TEXT, parameters TEXT, "
+            "status INTEGER, body TEXT, stored_at REAL)"
+        )
+        self._db.commit()
+
+    def __getstate__(self):
+        # Sent to report worker processes by path and settings, each process opens its own connection
+        return {
+            "path": self.path,
+            "replay_only": self.replay_only,
+            "endpoint_ttl": self.endpoint_ttl,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connect()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._connect()
+
+    def _ttl(self, path):
+        return self.endpoint_ttl.get(path, DEFAULT_TTL)
+
+    def get(self, server_url, path, parameters):
+        """
+        Return the cached JSON response of an API call, or None if it is missing or expired
+        NB! In replay only mode a missing response raises CacheMiss
+        """
+        key = cache_key(server_url, path, parameters)
+        self._check_pid()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is not None:
+            ttl = self._ttl(path)
+            # Expired responses are still good enough when replaying
+            if self.replay_only or ttl is None or time.time() - row[1] < ttl:
+                return json.loads(row[0])
+
+        if self.replay_only:
+            raise CacheMiss(
+                "Response not cached: " + server_url + path + "?" + str(parameters)
+            )
+        return None
+
+    def put(self, server_url, path, parameters, status, body):
+        """
+        Store the response of an API call
+        params:
+            status - HTTP status code
+            body   - response text
+        """
+        key = cache_key(server_url, path, parameters)
+        self._check_pid()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    server_url,
+                    path,
+                    json.dumps(parameters, sort_keys=True, default=str),
+                    status,
+                    body,
+                    time.time(),
+                ),
+            )
+            self._db.commit()
+
+    def clear(self, path=None):
+        """
+        Remove all cached responses, or only those of the given endpoint
+        """
+        self._check_pid()
+        with self._lock:
+            if path is None:
+                self._db.execute("DELETE FROM responses")
+            else:
+                self._db.execute("DELETE FROM responses WHERE path = ?", (path,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
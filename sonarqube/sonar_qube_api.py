@@ -1,26 +1,185 @@
+import atexit
 import logging
+import logging.handlers
+import os
 import requests
-import xlsxwriter
 import enum
-from datetime import date, datetime
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 import pytz
+import queue
+import sys
+import threading
+import time
+
+from response_cache import ResponseCache, CacheMiss
+from concurrency_limiter import AIMDLimiter
+from report_output import XlsxOutput
+from instrumentation import metrics
+
+# orjson is optional, it parses large issue pages considerably faster
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 """
     Set up logger format
+    Nothing is attached at import, call configure_logging to enable output. Records are handed to a queue and
+    written by a background thread, so API calls never wait for log I/O.
 """
 logger = logging.getLogger("metrics")
-logger.setLevel(logging.DEBUG)
-fh = logging.FileHandler("metrics.log")
-fh.setLevel(logging.DEBUG)
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
-
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-logger.addHandler(fh)
-logger.addHandler(ch)
+# Per-call debug lines (one per API call), the bulk of the log on large crawls
+api_logger = logging.getLogger("metrics.api")
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Background listener and queue handler installed by configure_logging
+_log_listener = None
+_log_queue_handler = None
+# Arguments of the last configure_logging call (see process_settings)
+_logging_settings = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Sample and rate limit log records: keep one record in sample_every, and at most max_per_second of those.
+    The number of dropped records is appended to the next record kept.
+    """
+
+    def __init__(self, sample_every=1, max_per_second=None):
+        super().__init__()
+        self.sample_every = max(1, sample_every)
+        self.max_per_second = max_per_second
+        self.dropped = 0
+        self._dropped_since_kept = 0
+        self._seen = 0
+        self._tokens = max_per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        with self._lock:
+            self._seen += 1
+            keep = (self._seen - 1) % self.sample_every == 0
+            if keep and self.max_per_second is not None:
+                # Token bucket, refilled at max_per_second and holding at most one second worth of records
+                now = time.monotonic()
+                self._tokens = min(
+                    self.max_per_second,
+                    self._tokens + (now - self._last) * self.max_per_second,
+                )
+                self._last = now
+                keep = self._tokens >= 1
+                if keep:
+                    self._tokens -= 1
+            if not keep:
+                self.dropped += 1
+                self._dropped_since_kept += 1
+                return False
+            if self._dropped_since_kept:
+                record.msg = (
+                    str(record.msg)
+                    + " ["
+                    + str(self._dropped_since_kept)
+                    + " similar lines dropped]"
+                )
+                self._dropped_since_kept = 0
+            return True
+
+
+def configure_logging(
+    level=logging.DEBUG,
+    log_file="metrics.log",
+    console=True,
+    api_sample_every=1,
+    api_max_per_second=None,
+):
+    """
+    (Re)configure the metrics logger. Can be called again at runtime, e.g. to change the level or the sampling.
+    params:
+        level              - Logging level of the metrics logger
+        log_file           - File to append log lines to (None = no file)
+        console            - Also log to stderr
+        api_sample_every   - Keep one per-call API debug line in api_sample_every
+        api_max_per_second - Keep at most this many per-call API debug lines per second (None = no limit)
+    """
+    global _log_listener, _log_queue_handler, _logging_settings
+    shutdown_logging()
+    _logging_settings = {
+        "level": level,
+        "log_file": log_file,
+        "console": console,
+        "api_sample_every": api_sample_every,
+        "api_max_per_second": api_max_per_second,
+    }
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file is not None:
+        handlers.append(logging.FileHandler(log_file))
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # QueueHandler formats the message in the calling thread, as call parameters may change afterwards.
+    # Records below the level, or dropped by sampling, are never formatted.
+    log_queue = queue.SimpleQueue()
+    _log_queue_handler = logging.handlers.QueueHandler(log_queue)
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _log_listener.start()
+    logger.addHandler(_log_queue_handler)
+    logger.setLevel(level)
+
+    for log_filter in list(api_logger.filters):
+        if isinstance(log_filter, RateLimitFilter):
+            api_logger.removeFilter(log_filter)
+    if api_sample_every > 1 or api_max_per_second is not None:
+        api_logger.addFilter(RateLimitFilter(api_sample_every, api_max_per_second))
+
+
+def shutdown_logging():
+    """
+    Write out queued log records and detach the handlers installed by configure_logging
+    """
+    global _log_listener, _log_queue_handler
+    if _log_queue_handler is not None:
+        logger.removeHandler(_log_queue_handler)
+        _log_queue_handler = None
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+
+
+def _log_directly_after_fork():
+    """
+    The listener thread does not exist in a forked process. Worker processes exit without running atexit
+    handlers, so they log directly to the handlers instead of through a queue that may never be written out.
+    """
+    global _log_listener, _log_queue_handler
+    if _log_listener is None:
+        return
+    logger.removeHandler(_log_queue_handler)
+    for handler in _log_listener.handlers:
+        logger.addHandler(handler)
+    _log_listener = None
+    _log_queue_handler = None
+
+
+# Windows has no fork (nor os.register_at_fork)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_log_directly_after_fork)
+atexit.register(shutdown_logging)
 
 """
     Constants  
@@ -35,6 +194,9 @@ PROJECT_SEARCH_URL = "/api/projects/search"
 PROJECT_METRIC_URL = "/api/measures/component"
 ISSUES_SEARCH = "/api/issues/search"
 
+# SonarQube returns at most this many results for one filter, regardless of paging
+ISSUES_SEARCH_RESULT_CAP = 10000
+
 """
     SonarQube API ports
 """
@@ -44,6 +206,22 @@ SONAR_SERVER_HISTORY_URL = "http://localhost:9000"
 # Server where each project version was analyzed independently
 SONAR_SERVER_SINGLE_URL = "http://localhost:9100"
 
+# Credentials used for both servers
+SONAR_ADMIN_USER = "admin"
+SONAR_ADMIN_PASSWORD = "Parola123456789!"
+
+"""
+    SonarQube HTTP client settings
+"""
+# Maximum number of keep-alive connections kept open to one server
+DEFAULT_POOL_SIZE = 16
+# Retries for connection errors, read timeouts, 429 and 5xx responses
+DEFAULT_MAX_RETRIES = 5
+# Sleep between retries is backoff_factor * 2^(retry - 1) seconds
+DEFAULT_BACKOFF_FACTOR = 0.5
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (10, 120)
+
 """
     Helper functions
 """
@@ -69,9 +247,16 @@ def sq_datetime_to_date(sq_datetime):
         Python date objects (e.g. date(2013,10,16), for the example above)
     """
     # return date(int(sq_datetime[:4]), int(sq_datetime[5:7]), int(sq_datetime[8:10]))
-    return date.fromisoformat(sq_datetime[:10])
+    return _iso_date(sq_datetime[:10])
+
 
+@functools.lru_cache(maxsize=None)
+def _iso_date(iso_date):
+    # Issues are created on a handful of analysis dates, so this is mostly cache hits
+    return date.fromisoformat(iso_date)
 
+
+@functools.lru_cache(maxsize=4096)
 def sq_duration_to_minutes(sq_duration):
     """
     Convert SonarQube time duration to minutes.
@@ -99,7 +284,26 @@ def sq_duration_to_minutes(sq_duration):
     return 480 * days + 60 * hours + int(sq_duration[:min_index])
 
 
-def _set_issue_lifetime(issue, project_analyses):
+def _analysis_date_index(project_analyses):
+    """
+    Map analysis dates to analysis indices, built once per project and reused by @_set_issue_lifetime
+    params:
+        project_analyses - The list of project analyses sorted increasing by date
+    output:
+        (created, closed) tuple of dictionaries of (<date>, <index>) entries, where created holds the last
+        and closed the first analysis index on each date
+    """
+    created = {}
+    closed = {}
+    for index in range(len(project_analyses)):
+        analysis_date = project_analyses[index].date
+        created[analysis_date] = index
+        if analysis_date not in closed:
+            closed[analysis_date] = index
+    return created, closed
+
+
+def _set_issue_lifetime(issue, project_analyses, date_index=None):
     """
     Calculate the issue's lifetime (number of versions until fixed)
     Stored in the new issue.lifetime field (0 - if issue.resolution is not FIXED)
@@ -107,6 +311,7 @@ def _set_issue_lifetime(issue, project_analyses):
     input:
         issue - the issue itself
         project_analyses - The list of project analyses sorted increasing by date
+        date_index - Result of @_analysis_date_index for project_analyses (built if None)
     output:
         issue.lifetime (new object attribute)
     NB! issue.lifetime = 0 for unresolved issues
@@ -115,14 +320,10 @@ def _set_issue_lifetime(issue, project_analyses):
         issue.lifetime = 0
         return
 
-    created_index = -1
-    closed_index = -1
-    for index in range(len(project_analyses)):
-        if project_analyses[index].date == issue.creationDate:
-            created_index = index
-        if project_analyses[index].date == issue.closeDate:
-            closed_index = index
-            break
+    if date_index is None:
+        date_index = _analysis_date_index(project_analyses)
+    created_index = date_index[0].get(issue.creationDate, -1)
+    closed_index = date_index[1].get(issue.closeDate, -1)
 
     assert -1 < created_index < closed_index < len(project_analyses)
     issue.lifetime = closed_index - created_index
@@ -168,20 +369,52 @@ class Type(enum.Enum):
         return self.name
 
 
+# Lookup tables used to decode issue fields
+SEVERITY_BY_NAME = {severity.name: severity for severity in Severity}
+TYPE_BY_NAME = {issue_type.name: issue_type for issue_type in Type}
+
+
 class Issue:
     """
     Represents a SonarQube issue
+    NB! Hundreds of thousands of issues are kept in memory, so instances have no __dict__,
+    repeated strings (rule, project, component, tags) are interned and the raw JSON is not kept by default
     """
 
-    def __init__(self, json_data):
+    __slots__ = (
+        "key",
+        "rule",
+        "json",
+        "hash",
+        "message",
+        "project",
+        "component",
+        "resolution",
+        "status",
+        "creationDate",
+        "updateDate",
+        "closeDate",
+        "debt",
+        "severity",
+        "type",
+        "tags",
+        "lifetime",
+    )
+
+    def __init__(self, json_data, keep_json=False):
+        """
+        params:
+            json_data - issue as returned by /api/issues/search
+            keep_json - keep json_data in issue.json (None otherwise)
+        """
         self.key = json_data["key"]
-        self.rule = json_data["rule"]
-        self.json = json_data
+        self.rule = sys.intern(json_data["rule"])
+        self.json = json_data if keep_json else None
         self.hash = json_data["hash"] if "hash" in json_data else "n/a"
         self.message = json_data["message"]
         column_index = json_data["component"].index(":")
-        self.project = json_data["component"][:column_index]
-        self.component = json_data["component"][column_index + 1 :]
+        self.project = sys.intern(json_data["component"][:column_index])
+        self.component = sys.intern(json_data["component"][column_index + 1 :])
 
         # Issue resolution, key is missing if issue is not yet resolved
         if "resolution" in json_data:
@@ -222,33 +455,37 @@ class Issue:
         )
 
         # Handle issue severity
-        if json_data["severity"] == "INFO":
-            self.severity = Severity.INFO
-        elif json_data["severity"] == "MINOR":
-            self.severity = Severity.MINOR
-        elif json_data["severity"] == "MAJOR":
-            self.severity = Severity.MAJOR
-        elif json_data["severity"] == "CRITICAL":
-            self.severity = Severity.CRITICAL
-        elif json_data["severity"] == "BLOCKER":
-            self.severity = Severity.BLOCKER
-        else:
-            assert False, "Invalid issue severity"
+        assert json_data["severity"] in SEVERITY_BY_NAME, "Invalid issue severity"
+        self.severity = SEVERITY_BY_NAME[json_data["severity"]]
 
         # Issue type
-        if json_data["type"] == "CODE_SMELL":
-            self.type = Type.CODE_SMELL
-        elif json_data["type"] == "BUG":
-            self.type = Type.BUG
-        elif json_data["type"] == "VULNERABILITY":
-            self.type = Type.VULNERABILITY
-        else:
-            assert False, "Invalid issue type"
+        assert json_data["type"] in TYPE_BY_NAME, "Invalid issue type"
+        self.type = TYPE_BY_NAME[json_data["type"]]
 
         # Issue tag list
         # For the moment we just use strings, as there are many possible tags https://docs.sonarqube.org/latest/user-guide/built-in-rule-tags/
         # Also, tags are detailed in the sense of appearing not OWASP, but owasp-a4, which is good (extra detail) and not so good (enum would be too complicated)
-        self.tags = param_list_to_strings(json_data["tags"])
+        self.tags = tuple(sys.intern(tag) for tag in json_data["tags"])
+
+
+def decode_issues(raw_issues, columnar=False, keep_json=False):
+    """
+    Decode a whole page of issues at once
+    params:
+        raw_issues - List of issue dictionaries, or the raw body (str/bytes) of an /api/issues/search response
+        columnar   - Return an IssueTable instead of a list of Issue instances
+        keep_json  - Keep the raw JSON of each issue in issue.json (ignored if columnar)
+    output:
+        List of Issue instances, or IssueTable
+    """
+    if isinstance(raw_issues, (str, bytes, bytearray)):
+        raw_issues = json_loads(raw_issues)["issues"]
+    if columnar:
+        # issue_table imports this module
+        from issue_table import IssueTable
+
+        return IssueTable.from_json(raw_issues)
+    return [Issue(json_data, keep_json) for json_data in raw_issues]
 
 
 class ProjectAnalysis:
@@ -256,12 +493,350 @@ class ProjectAnalysis:
     Represents a SonarQube project analysis
     """
 
+    __slots__ = ("project", "version", "date")
+
     def __init__(self, project, version, date):
-        self.project = project
+        self.project = sys.intern(project)
         self.version = version
         self.date = sq_datetime_to_date(date)
 
 
+"""
+    SonarQube HTTP client
+"""
+
+
+class SonarQubeError(RuntimeError):
+    """
+    Raised when SonarQube answers a call with an error message instead of a result
+    """
+
+    pass
+
+
+class SonarQubeClient:
+    """
+    Pooled, keep-alive client for one SonarQube server.
+    All calls share one requests.Session, so TCP connections are reused across calls.
+    Connection errors, read timeouts, 429 and 5xx responses are retried with exponential backoff.
+    Calls in flight are held to the AIMD limit of the server (see concurrency_limiter), shared by all its clients.
+    """
+
+    def __init__(
+        self,
+        server_url,
+        user=SONAR_ADMIN_USER,
+        password=SONAR_ADMIN_PASSWORD,
+        pool_size=DEFAULT_POOL_SIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        timeout=DEFAULT_TIMEOUT,
+        cache=None,
+        adaptive_concurrency=True,
+    ):
+        """
+        params:
+            server_url     - URL of SonarQube server (e.g. SONAR_SERVER_HISTORY_URL)
+            user           - name of admin user account
+            password       - password of admin user account
+            pool_size      - maximum number of pooled connections to the server
+            max_retries    - retries on connection errors, timeouts and 5xx responses
+            backoff_factor - exponential backoff factor between retries (seconds)
+            timeout        - (connect, read) timeout in seconds
+            cache          - ResponseCache used to store and replay responses (None = no caching)
+            adaptive_concurrency - Hold calls to the AIMD limit of the server (False = only callers limit concurrency)
+        """
+        self.server_url = server_url
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.cache = cache
+        self.adaptive_concurrency = adaptive_concurrency
+        self.session = self._new_session(user, password)
+
+    def _new_session(self, user, password):
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            backoff_factor=self.backoff_factor,
+            raise_on_status=False,
+        )
+        # One host per client, so a single pool holding up to pool_size connections
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry
+        )
+        session = requests.Session()
+        session.auth = HTTPBasicAuth(user, password)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def reset_session(self):
+        """
+        Replace the session with a new one, with the same settings and no open connections.
+        Used in forked processes, which must not share the parent's connections.
+        """
+        auth = self.session.auth
+        self.session = self._new_session(auth.username, auth.password)
+
+    def get(self, path, parameters, use_cache=True):
+        """
+        GET call to the SonarQube API
+        params:
+            path       - the GET path (e.g. '/api/projects/search')
+            parameters - dict of call parameters
+            use_cache  - Read and store the response in the cache; False for calls whose answer changes over time
+                         with the same parameters (e.g. issues sorted by update date)
+        output:
+            Dictionary-formatted JSON
+        """
+        if self.cache is not None and not use_cache and self.cache.replay_only:
+            raise CacheMiss(
+                "Response never cached: "
+                + self.server_url
+                + path
+                + "?"
+                + str(parameters)
+            )
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(self.server_url, path, parameters)
+            if cached is not None:
+                metrics.record_cache_hit(self.server_url, path)
+                return cached
+
+        # One line per call, sampled and rate limited by configure_logging
+        api_logger.debug("API: %s%s?%s", self.server_url, path, parameters)
+        limiter = (
+            get_concurrency_limiter(self.server_url)
+            if self.adaptive_concurrency
+            else None
+        )
+        if limiter is not None:
+            limiter.acquire()
+        # Failed calls count as overload
+        overloaded = True
+        start = time.perf_counter()
+        try:
+            r = self.session.get(
+                self.server_url + path, params=parameters, timeout=self.timeout
+            )
+            # Retries made by urllib3 before the final response
+            retries = getattr(r.raw, "retries", None)
+            history = retries.history if retries is not None else ()
+            overloaded = _is_overloaded(r.status_code) or any(
+                attempt.error is not None or _is_overloaded(attempt.status or 0)
+                for attempt in history
+            )
+        except requests.RequestException:
+            metrics.record_error(self.server_url, path, time.perf_counter() - start)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            if limiter is not None:
+                limiter.release(seconds, overloaded, path)
+        metrics.record_call(
+            self.server_url,
+            path,
+            seconds,
+            r.status_code,
+            len(r.content),
+            len(history),
+        )
+        result = json_loads(r.content)
+
+        # Not found is a stable answer (e.g. files renamed in later versions), other errors are not
+        if self.cache is not None and use_cache and (r.ok or r.status_code == 404):
+            self.cache.put(self.server_url, path, parameters, r.status_code, r.text)
+        return result
+
+    def close(self):
+        self.session.close()
+
+
+def _is_overloaded(status_code):
+    """
+    Responses that signal an overloaded server (too many requests, server errors)
+    """
+    return status_code == 429 or status_code >= 500
+
+
+# Clients are shared by all API functions, one per (server, user) pair
+_clients = {}
+# Concurrency limiters, one per server
+_limiters = {}
+# Number of processes sharing the concurrency limits of each server (see share_concurrency_limits)
+_limit_shares = 1
+# Arguments of configure_client and configure_concurrency_limiter calls, by server (see process_settings)
+_client_settings = {}
+_limiter_settings = {}
+_clients_lock = threading.Lock()
+# Response cache given to every client
+_response_cache = None
+
+
+def set_response_cache(cache):
+    """
+    Use the given ResponseCache for all SonarQube calls (None disables caching)
+    e.g. set_response_cache(ResponseCache("sonarqube_cache.sqlite", replay_only=True))
+    """
+    global _response_cache
+    with _clients_lock:
+        _response_cache = cache
+        for client in _clients.values():
+            client.cache = cache
+
+
+def configure_client(server_url, **kwargs):
+    """
+    Replace the shared client for the given server (e.g. to change pool size, retries or timeouts)
+    params:
+        server_url - URL of SonarQube server
+        kwargs     - SonarQubeClient constructor arguments
+    output:
+        The new SonarQubeClient instance
+    """
+    settings = {k: v for k, v in kwargs.items() if k != "cache"}
+    kwargs.setdefault("cache", _response_cache)
+    client = SonarQubeClient(server_url, **kwargs)
+    key = (server_url, client.session.auth.username, client.session.auth.password)
+    with _clients_lock:
+        _client_settings[server_url] = settings
+        if key in _clients:
+            _clients[key].close()
+        _clients[key] = client
+    return client
+
+
+def get_client(server_url, user=SONAR_ADMIN_USER, password=SONAR_ADMIN_PASSWORD):
+    """
+    Return the shared client for the given server, creating it on first use
+    """
+    key = (server_url, user, password)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = SonarQubeClient(
+                server_url, user, password, cache=_response_cache
+            )
+        return _clients[key]
+
+
+def configure_concurrency_limiter(server_url, **kwargs):
+    """
+    Replace the concurrency limiter of the given server (e.g. to change its initial or maximum limit)
+    params:
+        server_url - URL of SonarQube server
+        kwargs     - AIMDLimiter constructor arguments
+    output:
+        The new AIMDLimiter instance
+    """
+    kwargs.setdefault("max_limit", DEFAULT_POOL_SIZE)
+    limiter = AIMDLimiter(server_url, **kwargs)
+    with _clients_lock:
+        _limiter_settings[server_url] = kwargs
+        if _limit_shares > 1:
+            limiter.share(_limit_shares)
+        _limiters[server_url] = limiter
+    return limiter
+
+
+def get_concurrency_limiter(server_url):
+    """
+    Return the concurrency limiter of the given server, creating it on first use
+    The limit never exceeds DEFAULT_POOL_SIZE, the default number of pooled connections
+    """
+    with _clients_lock:
+        if server_url not in _limiters:
+            limiter = AIMDLimiter(server_url, max_limit=DEFAULT_POOL_SIZE)
+            if _limit_shares > 1:
+                limiter.share(_limit_shares)
+            _limiters[server_url] = limiter
+        return _limiters[server_url]
+
+
+def share_concurrency_limits(processes):
+    """
+    Divide the concurrency limits of every server (current and future limiters) between the given number of
+    processes calling the servers at the same time (e.g. in each report worker process)
+    """
+    global _limit_shares
+    with _clients_lock:
+        _limit_shares = processes
+        for limiter in _limiters.values():
+            limiter.share(processes)
+
+
+def get_response_cache():
+    """
+    Return the ResponseCache used for all SonarQube calls (None if caching is disabled)
+    """
+    return _response_cache
+
+
+def set_server_urls(history_url=None, single_url=None):
+    """
+    Point the API functions to other servers (e.g. the fake_sonarqube stand-in), None keeps the current URL
+    """
+    global SONAR_SERVER_HISTORY_URL, SONAR_SERVER_SINGLE_URL
+    if history_url is not None:
+        SONAR_SERVER_HISTORY_URL = history_url
+    if single_url is not None:
+        SONAR_SERVER_SINGLE_URL = single_url
+
+
+def process_settings():
+    """
+    Settings of this module changed at runtime: server URLs, client, limiter and logging configuration.
+    Forked processes inherit them, spawned ones (e.g. on Windows and macOS) start from the defaults and apply
+    them with @apply_process_settings
+    output:
+        Picklable dictionary
+    """
+    with _clients_lock:
+        return {
+            "server_urls": (SONAR_SERVER_HISTORY_URL, SONAR_SERVER_SINGLE_URL),
+            "clients": dict(_client_settings),
+            "limiters": dict(_limiter_settings),
+            "logging": _logging_settings,
+        }
+
+
+def apply_process_settings(settings):
+    """
+    params:
+        settings - Result of @process_settings in the parent process
+    """
+    set_server_urls(*settings["server_urls"])
+    for server_url, kwargs in settings["clients"].items():
+        configure_client(server_url, **kwargs)
+    for server_url, kwargs in settings["limiters"].items():
+        configure_concurrency_limiter(server_url, **kwargs)
+    if settings["logging"] is not None:
+        configure_logging(**settings["logging"])
+
+
+def _reset_clients_after_fork():
+    """
+    A forked process keeps the shared clients and their settings, but opens its own connections.
+    The lock may have been held by another thread of the parent at the time of the fork.
+    """
+    global _clients_lock
+    _clients_lock = threading.Lock()
+    for client in _clients.values():
+        client.reset_session()
+    # Calls in flight belong to the parent, each process has its own limit (see share_concurrency_limits)
+    for limiter in _limiters.values():
+        limiter.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+
 """
     SonarQube API functions
 """
@@ -276,63 +851,68 @@ def api_metrics_search(sonarServerURL):
         list of retrieved metric keys
     """
     logger.debug(
-        "Contacting SonarQube server for metrics -" + sonarServerURL + METRIC_SEARCH_URL
+        "Contacting SonarQube server for metrics -%s%s",
+        sonarServerURL,
+        METRIC_SEARCH_URL,
     )
-    r = requests.get(sonarServerURL + METRIC_SEARCH_URL, params={"ps": 500})
-    data = r.json()
-
     # Process the JSON result
     result = []
-    metricList = data["metrics"]
-    for metric in metricList:
+    for metric in _paginate(
+        get_client(sonarServerURL).get, METRIC_SEARCH_URL, {}, "metrics"
+    ):
         # Metric key should be unique
         assert metric["key"] not in result
         result.append(metric["key"])
-    logger.debug("Metrics retrieved -  " + str(result))
+    logger.debug("Metrics retrieved -  %s", result)
     return result
 
 
 def api_measures_search_history_xlsx(
-    measures, xlsxOutput="./api_measures_search_history.xlsx"
+    measures,
+    xlsxOutput="./api_measures_search_history.xlsx",
+    constant_memory=False,
+    output=None,
 ):
     """
     Save the measures from @api_measures_search_history call to an XLSX file
     params:
         measures - The JSON return of an @api_measures_search_history call
-        xlsxOutput - Output file
+        xlsxOutput - Output file (its name without extension is the report name for other outputs)
+        constant_memory - Flush each row to disk once written, caps memory use for large histories
+        output - Output backend from report_output (XLSX if None)
     """
-    book = xlsxwriter.Workbook(xlsxOutput)
-    outSheet = book.add_worksheet()
-    cell_format = book.add_format()
-    cell_format.set_num_format("0.000")
+    if output is None:
+        output = XlsxOutput(constant_memory=constant_memory)
+    report = output.open(os.path.splitext(xlsxOutput)[0])
+
+    # 1. Metric names go in column headers
+    metric_names = [metric["metric"] for metric in measures["measures"]]
+    table = report.table(
+        "measures_history",
+        ["date"] + metric_names,
+        sheet="Sheet1",
+        sheet_header=[None] + metric_names,
+    )
 
-    # 1. Write date info to first column
-    row = 1
-    for date in measures["measures"][0]["history"]:
+    # 2. Rows are written in order: the date in the first column, then the value of each metric for that date
+    dates = measures["measures"][0]["history"]
+    row_count = max(len(metric["history"]) for metric in measures["measures"])
+    for row in range(row_count):
         # Write the date information to the first column
-        outSheet.write(row, 0, date["date"][:10])
-        row += 1
-
-    # 2. Write each metric on its own column
-    col = 1
-    for metric in measures["measures"]:
-        row = 0
-        # Metric name goes in column header
-        outSheet.write(row, col, metric["metric"])
-        row = 1
-        # Each row contains the metric value for the given date
-        for metricValue in metric["history"]:
-            if "value" in metricValue:
-                outSheet.write(row, col, metricValue["value"])
+        values = [dates[row]["date"][:10] if row < len(dates) else None]
+        for metric in measures["measures"]:
+            if row >= len(metric["history"]):
+                values.append(None)
+            elif "value" in metric["history"][row]:
+                values.append(metric["history"][row]["value"])
             else:
-                outSheet.write(row, col, "n/a")
-            row += 1
-        col += 1
-    book.close()
+                values.append("n/a")
+        table.write_row(values)
+    report.close()
 
 
 def _sonar_qube_single_api_call(
-    path, parameters, adminUser="admin", adminPassword="Parola123456789!"
+    path, parameters, adminUser=SONAR_ADMIN_USER, adminPassword=SONAR_ADMIN_PASSWORD
 ):
     """
     Generic call to SonarQube API
@@ -342,17 +922,17 @@ def _sonar_qube_single_api_call(
         adminUser      - name of admin user account
         adminPassword  - password of admin user account
     """
-    logger.debug("API: " + SONAR_SERVER_SINGLE_URL + path + "?" + str(parameters))
-    r = requests.get(
-        SONAR_SERVER_SINGLE_URL + path,
-        auth=HTTPBasicAuth(adminUser, adminPassword),
-        params=parameters,
+    return get_client(SONAR_SERVER_SINGLE_URL, adminUser, adminPassword).get(
+        path, parameters
     )
-    return r.json()
 
 
 def _sonar_qube_api_call(
-    path, parameters, adminUser="admin", adminPassword="Parola123456789!"
+    path,
+    parameters,
+    adminUser=SONAR_ADMIN_USER,
+    adminPassword=SONAR_ADMIN_PASSWORD,
+    use_cache=True,
 ):
     """
     Generic call to SonarQube API
@@ -361,31 +941,110 @@ def _sonar_qube_api_call(
         parameters     - dict of call parameters
         adminUser      - name of admin user account
         adminPassword  - password of admin user account
+        use_cache      - False bypasses the response cache (see SonarQubeClient.get)
     """
-    logger.debug("API: " + SONAR_SERVER_HISTORY_URL + path + "?" + str(parameters))
-    r = requests.get(
-        SONAR_SERVER_HISTORY_URL + path,
-        auth=HTTPBasicAuth(adminUser, adminPassword),
-        params=parameters,
+    return get_client(SONAR_SERVER_HISTORY_URL, adminUser, adminPassword).get(
+        path, parameters, use_cache
     )
-    return r.json()
+
+
+def _is_not_found(error):
+    """
+    SonarQube answers 404 with e.g. "Component key 'jEdit.4.3' not found"
+    """
+    return "not found" in str(error).lower()
+
+
+def _paginate(
+    api_call,
+    path,
+    parameters,
+    items_key,
+    page_size=500,
+    read_ahead=False,
+    result_cap=None,
+):
+    """
+    Generic generator over the items of a paged SonarQube endpoint; pages are fetched as items are consumed
+    params:
+        api_call   - function (path, parameters) -> JSON used for the calls (e.g. _sonar_qube_api_call)
+        path       - the GET path (e.g. '/api/projects/search')
+        parameters - dict of call parameters (without paging)
+        items_key  - key of the item list in each page (e.g. 'components')
+        page_size  - number of items per page
+        read_ahead - fetch the next page in the background while the items of the current page are consumed
+        result_cap - stop after this many items, even if there are more (e.g. ISSUES_SEARCH_RESULT_CAP)
+    output:
+        Generator of the items of all pages, in order
+    """
+
+    def fetch_page(page):
+        page_parameters = dict(parameters)
+        page_parameters["ps"] = page_size
+        page_parameters["p"] = page
+        result = api_call(path, page_parameters)
+        if "errors" in result:
+            raise SonarQubeError(
+                path + "?" + str(page_parameters) + " - " + result["errors"][0]["msg"]
+            )
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=1) if read_ahead else None
+    try:
+        # Results have at least one page
+        current_page = 1
+        page_data = fetch_page(current_page)
+        while True:
+            # Total is either in the paging section or at top level, depending on the endpoint
+            total = int(
+                page_data["paging"]["total"]
+                if "paging" in page_data
+                else page_data["total"]
+            )
+            if result_cap is not None:
+                total = min(total, result_cap)
+
+            # Is there another page?
+            next_page = None
+            if current_page * page_size < total and len(page_data[items_key]) > 0:
+                if executor is not None:
+                    next_page = executor.submit(fetch_page, current_page + 1)
+                else:
+                    next_page = current_page + 1
+
+            items = page_data[items_key]
+            if result_cap is not None:
+                items = items[: max(0, result_cap - (current_page - 1) * page_size)]
+            for item in items:
+                yield item
+
+            if next_page is None:
+                return
+            current_page += 1
+            page_data = (
+                next_page.result() if executor is not None else fetch_page(next_page)
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
 
 def api_projects_search():
     """
     Retrieve projects
-    NB! Page size set to 500 (max value), so only the first 500 projects are returned
     output:
         List of retrieved project names
     """
     PROJECT_SEARCH_URL = "/api/projects/search"
-    data = _sonar_qube_api_call(PROJECT_SEARCH_URL, {"ps": 500})
 
     result = []
-    components = data["components"]
-    for component in components:
+    seen = set()
+    for component in _paginate(
+        _sonar_qube_api_call, PROJECT_SEARCH_URL, {}, "components"
+    ):
         # Project key should be unique
-        assert component["key"] not in result
+        assert component["key"] not in seen
+        seen.add(component["key"])
         result.append(component["key"])
     return result
 
@@ -399,16 +1058,75 @@ def api_project_analyses(project):
         List of ProjectAnalysis instances
     """
     PROJECT_ANALYSES_URL = "/api/project_analyses/search"
-    result_json = _sonar_qube_api_call(PROJECT_ANALYSES_URL, {"project": project})
 
     result = []
-    for analysis in result_json["analyses"]:
+    for analysis in _paginate(
+        _sonar_qube_api_call, PROJECT_ANALYSES_URL, {"project": project}, "analyses"
+    ):
         result.append(
             ProjectAnalysis(project, analysis["projectVersion"], analysis["date"])
         )
     return result
 
 
+class ProjectCatalog:
+    """
+    Projects and their analyses (sorted by ascending date), fetched once and shared
+    by the issue queries and the analysis functions
+    """
+
+    def __init__(self):
+        self._projects = None
+        # Dictionary of (<project name>, [<analysis_1>,...,<analysis_k>]) entries
+        self._analyses = {}
+
+    def projects(self):
+        """
+        output:
+            List of project names
+        """
+        if self._projects is None:
+            self._projects = api_projects_search()
+        return self._projects
+
+    def analyses(self, project):
+        """
+        output:
+            List of ProjectAnalysis instances of the project, sorted increasing by date
+        """
+        if project not in self._analyses:
+            self._analyses[project] = sorted(
+                api_project_analyses(project), key=lambda x: x.date
+            )
+        return self._analyses[project]
+
+    def all_analyses(self):
+        """
+        output:
+            List of ProjectAnalysis instances of all projects, sorted by project and increasing by date
+        """
+        result = []
+        for project in self.projects():
+            result.extend(self.analyses(project))
+        return result
+
+    def load(self, max_concurrency=1):
+        """
+        Fetch all projects and their analyses that were not fetched yet
+        params:
+            max_concurrency - Maximum number of API calls in flight (1 = sequential)
+        """
+        missing = [p for p in self.projects() if p not in self._analyses]
+        if max_concurrency > 1 and len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                fetched = list(executor.map(api_project_analyses, missing))
+        else:
+            fetched = [api_project_analyses(p) for p in missing]
+        for project, analyses in zip(missing, fetched):
+            self._analyses[project] = sorted(analyses, key=lambda x: x.date)
+        return self
+
+
 def api_measures_search_history(component, metrics):
     """
     Retrieve measure data history for SonarQube project(s) in the given instance (tested with SonarQube 8.2 Community Edition)
@@ -427,100 +1145,323 @@ def api_measures_search_history(component, metrics):
     )
 
 
+def _sq_datetime_string(python_datetime):
+    """
+    Convert timezone-aware Python datetime to SonarQube date/time string (e.g. "2013-10-16T00:00:00+0000")
+    """
+    return python_datetime.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+
+def _issues_search_window_parameters(window):
+    """
+    Build the /api/issues/search parameters selecting the issues of a query window
+    params:
+        window - (project, created after (inclusive), created before (exclusive), filter dict) tuple
+    """
+    project, created_after, created_before, filters = window
+    parameters = {
+        "components": project,
+        "createdAfter": _sq_datetime_string(created_after),
+        "createdBefore": _sq_datetime_string(created_before),
+    }
+    parameters.update(filters)
+    return parameters
+
+
+def _split_issues_search_window(window):
+    """
+    Split a query window that matches too many issues into narrower windows covering the same issues.
+    Windows are bisected by creation date down to one second, and then split by issue type and severity.
+    params:
+        window - (project, created after (inclusive), created before (exclusive), filter dict) tuple
+    output:
+        List of windows, or None if the window cannot be split any further
+    """
+    project, created_after, created_before, filters = window
+    seconds = int((created_before - created_after).total_seconds())
+    if seconds > 1:
+        middle = created_after + timedelta(seconds=seconds // 2)
+        return [
+            (project, created_after, middle, filters),
+            (project, middle, created_before, filters),
+        ]
+
+    issue_types = filters["types"].split(",") if filters.get("types") else []
+    if len(issue_types) > 1:
+        return [
+            (project, created_after, created_before, dict(filters, types=issue_type))
+            for issue_type in issue_types
+        ]
+    if "severities" not in filters:
+        return [
+            (
+                project,
+                created_after,
+                created_before,
+                dict(filters, severities=str(severity)),
+            )
+            for severity in Severity
+        ]
+    return None
+
+
+def _issues_search_page(parameters, page, page_size, checkpoint=None):
+    """
+    Fetch one page of /api/issues/search results
+    params:
+        parameters - issue filter parameters (without paging)
+        page       - page number, starting at 1
+        page_size  - number of issues per page
+        checkpoint - CrawlCheckpoint the page is read from if already fetched, and stored to otherwise
+    """
+    ISSUES_SEARCH = "/api/issues/search"
+    #
+    # TODO
+    # There are 2 *_api_call functions:
+    # (a) hits the HISTORY server
+    # (b) hits the SINGLE server
+    #
+    page_parameters = dict(parameters)
+    page_parameters["ps"] = page_size
+    page_parameters["p"] = page
+    if checkpoint is not None:
+        result = checkpoint.get(
+            SONAR_SERVER_HISTORY_URL, ISSUES_SEARCH, page_parameters
+        )
+        if result is not None:
+            return result
+    result = _sonar_qube_api_call(ISSUES_SEARCH, page_parameters)
+    if "errors" in result:
+        raise SonarQubeError(
+            ISSUES_SEARCH
+            + "?"
+            + str(page_parameters)
+            + " - "
+            + result["errors"][0]["msg"]
+        )
+    if checkpoint is not None:
+        checkpoint.put(SONAR_SERVER_HISTORY_URL, ISSUES_SEARCH, page_parameters, result)
+    return result
+
+
+def _issues_search_filters(languages, resolutions, types):
+    """
+    Build the /api/issues/search filter parameters shared by all query windows
+    """
+    return {
+        "languages": param_list_to_strings(languages) if len(languages) > 0 else "",
+        "resolutions": (
+            param_list_to_strings(resolutions) if len(resolutions) > 0 else ""
+        ),
+        "types": param_list_to_strings(types),
+    }
+
+
+def _project_issues_search_window(project, analyses, filters):
+    """
+    Query window covering the creation dates of all analyses of a project, from its first to its last analysis date
+    params:
+        analyses - The list of project analyses sorted increasing by date
+    output:
+        (project, created after (inclusive), created before (exclusive), filter dict) tuple, None if no analyses
+    """
+    if len(analyses) == 0:
+        return None
+    created_after = datetime.combine(
+        analyses[0].date, datetime.min.time(), tzinfo=pytz.UTC
+    )
+    created_before = datetime.combine(
+        analyses[-1].date + timedelta(days=1), datetime.min.time(), tzinfo=pytz.UTC
+    )
+    return (project, created_after, created_before, filters)
+
+
+def _fetch_issues_search_windows(windows, call_map=map, page_size=500, checkpoint=None):
+    """
+    Fetch all issues of the given query windows, bisecting the windows that match more than 10k issues
+    NB! SonarQube cannot return more than 10k items for one filter!
+    params:
+        windows    - List of query windows
+        call_map   - map-like function used to issue the API calls (e.g. ThreadPoolExecutor.map)
+        page_size  - Number of issues per page
+        checkpoint - CrawlCheckpoint of the crawl (None = no checkpoint)
+    output:
+        (windows, window_pages) tuple; windows after bisection (in the order of the windows they were split from)
+        and the list of result pages of each window
+    """
+    fetch_first_page = lambda window: _issues_search_page(
+        _issues_search_window_parameters(window), 1, page_size, checkpoint
+    )
+
+    # 1. Bisect the windows matching more than 10k issues
+    # Each round fetches the first page of all new windows; a window's first page is kept once it is small enough
+    first_pages = [None] * len(windows)
+    while None in first_pages:
+        to_fetch = [
+            index for index in range(len(windows)) if first_pages[index] is None
+        ]
+        fetched = call_map(fetch_first_page, [windows[index] for index in to_fetch])
+        for index, first_page in zip(to_fetch, fetched):
+            first_pages[index] = first_page
+
+        split_windows = []
+        split_first_pages = []
+        for window, first_page in zip(windows, first_pages):
+            narrower_windows = None
+            if int(first_page["total"]) > ISSUES_SEARCH_RESULT_CAP:
+                narrower_windows = _split_issues_search_window(window)
+                if narrower_windows is None:
+                    logger.warning(
+                        "Only the first %d of %s issues are returned for %s",
+                        ISSUES_SEARCH_RESULT_CAP,
+                        first_page["total"],
+                        _issues_search_window_parameters(window),
+                    )
+            if narrower_windows is None:
+                split_windows.append(window)
+                split_first_pages.append(first_page)
+            else:
+                split_windows.extend(narrower_windows)
+                split_first_pages.extend([None] * len(narrower_windows))
+        windows = split_windows
+        first_pages = split_first_pages
+
+    # 2. Get the remaining pages of every window
+    more_pages = []
+    for window_index in range(len(windows)):
+        issue_count = min(
+            int(first_pages[window_index]["total"]), ISSUES_SEARCH_RESULT_CAP
+        )
+        page_count = (issue_count + page_size - 1) // page_size
+        for page in range(2, page_count + 1):
+            more_pages.append((window_index, page))
+    other_pages = call_map(
+        lambda unit: _issues_search_page(
+            _issues_search_window_parameters(windows[unit[0]]),
+            unit[1],
+            page_size,
+            checkpoint,
+        ),
+        more_pages,
+    )
+
+    # 3. Pages in (window, page) order
+    window_pages = [[first_page] for first_page in first_pages]
+    for unit, partial_result in zip(more_pages, other_pages):
+        window_pages[unit[0]].append(partial_result)
+    return windows, window_pages
+
+
+def _project_issues(raw_issues, analyses, keep_json=False):
+    """
+    Decode the issues of one project and calculate their lifetime
+    Only issues created on the date of a project analysis are kept.
+    params:
+        raw_issues - List of issue dictionaries as returned by /api/issues/search
+        analyses   - The list of project analyses sorted increasing by date
+        keep_json  - Keep the raw JSON of each issue in issue.json
+    output:
+        List of Issue instances
+    """
+    analysis_dates = set(x.date for x in analyses)
+    date_index = _analysis_date_index(analyses)
+
+    result = []
+    for new_issue in decode_issues(raw_issues, keep_json=keep_json):
+        # Issues created between analyses do not belong to any software version
+        if new_issue.creationDate not in analysis_dates:
+            continue
+        _set_issue_lifetime(new_issue, analyses, date_index)
+        result.append(new_issue)
+    return result
+
+
 def api_issues_search(
-    languages=[], resolutions=[], types=["CODE_SMELL", "BUG", "VULNERABILITY"]
+    languages=[],
+    resolutions=[],
+    types=["CODE_SMELL", "BUG", "VULNERABILITY"],
+    max_concurrency=1,
+    catalog=None,
+    keep_json=False,
+    checkpoint=None,
 ):
     """
     Returns all SonarQube issues
     NB! Implementation is complicated by the fact that SQ allows only 10k issues to be returned in 1 query.
-    Solution is to first query project analysis dates and filter the returned issues by date
-    (this makes sure all created issues are returned.)
+    Solution is to start with one query window per project, covering the creation dates of all its analyses,
+    and to bisect only those windows that match more than 10k issues (this makes sure all created issues are returned,
+    using as few queries as possible).
+    Only issues created on the date of a project analysis are returned.
+    Once the first page of a window says how many issues it matches, the remaining pages (and the windows
+    of all other projects) are independent, so with max_concurrency > 1 they are fetched in parallel.
+    Issues are returned in the same order as in the sequential case.
+    All requested types are retrieved in one pass.
+    With a checkpoint, a crawl that failed halfway resumes from the first page it had not fetched yet.
     params:
-        languages - List of languages to retrieve issues for
+        languages       - List of languages to retrieve issues for
+        resolutions     - List of issue resolutions to retrieve
+        types           - List of issue types to retrieve
+        max_concurrency - Maximum number of API calls in flight (1 = sequential)
+        catalog         - ProjectCatalog to reuse (projects and analyses are fetched if None)
+        keep_json       - Keep the raw JSON of each issue in issue.json
+        checkpoint      - CrawlCheckpoint storing the fetched pages until the crawl completes (None = no checkpoint)
     output:
-        List of issues. Each issue is a JSON-based dictionary as returned by the SonarQube API.
+        List of Issue instances
     """
-    ISSUES_SEARCH = "/api/issues/search"
-    PAGE_SIZE = 500
-    result = []
-    lang = param_list_to_strings(languages) if len(languages) > 0 else ""
-    resol = param_list_to_strings(resolutions) if len(resolutions) > 0 else ""
-    types = param_list_to_strings(types)
-    # 1. Get project analyses
-    project_analyses = {}
-    for p in api_projects_search():
-        project_analyses[p] = api_project_analyses(p)
-
-    # 2. Get issues filtered by analysis date
-    # NB! SonarQube cannot return more than 10k items for one filter!
-    result = []
-    for project in project_analyses.keys():
-        analyses = project_analyses[project]
-        # Sort analyses by ascending date to calculate issue lifetime
-        analyses.sort(key=lambda x: x.date)
-        for project_analysis in analyses:
-            # Results have at least one page
-            current_page = 0
-            more_pages = True
-            while more_pages == True:
-                current_page += 1
-
-                #
-                # TODO
-                # There are 2 *_api_call functions:
-                # (a) hits the HISTORY server
-                # (b) hits the SINGLE server
-                #
-                creation_date_min = datetime.combine(
-                    project_analysis.date, datetime.min.time(), tzinfo=pytz.UTC
-                )
-                sonarqube_creation_date_min = creation_date_min.strftime(
-                    "%Y-%m-%dT%H:%M:%S%z"
-                )
-
-                creation_date_max = datetime.combine(
-                    project_analysis.date, datetime.max.time(), tzinfo=pytz.UTC
-                )
-                sonarqube_creation_date_max = creation_date_max.strftime(
-                    "%Y-%m-%dT%H:%M:%S%z"
-                )
+    filters = _issues_search_filters(languages, resolutions, types)
+    if checkpoint is not None and checkpoint.units() > 0:
+        logger.info(
+            "Resuming issue crawl, %d pages already fetched", checkpoint.units()
+        )
 
-                partial_result = _sonar_qube_api_call(
-                    ISSUES_SEARCH,
-                    {
-                        "components": project_analysis.project,
-                        "createdAfter": sonarqube_creation_date_min,
-                        "createdBefore": sonarqube_creation_date_max,
-                        "ps": PAGE_SIZE,
-                        "p": current_page,
-                        "languages": lang,
-                        "resolutions": resol,
-                        "types": types,
-                    },
-                )
+    executor = (
+        ThreadPoolExecutor(max_workers=max_concurrency) if max_concurrency > 1 else None
+    )
+    # Executor.map returns results in submission order, same as the builtin map
+    call_map = executor.map if executor is not None else map
+    try:
+        # 1. Get project analyses, sorted by ascending date to calculate issue lifetime
+        if catalog is None:
+            catalog = ProjectCatalog()
+        catalog.load(max_concurrency)
+        project_analyses = {}
+        for project in catalog.projects():
+            project_analyses[project] = catalog.analyses(project)
+
+        # 2. One query window per project, from its first to its last analysis date
+        windows = []
+        for project in project_analyses.keys():
+            window = _project_issues_search_window(
+                project, project_analyses[project], filters
+            )
+            if window is not None:
+                windows.append(window)
+
+        # 3. Get the issues of all windows
+        windows, window_pages = _fetch_issues_search_windows(
+            windows, call_map, checkpoint=checkpoint
+        )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # 4. Build issues, in (window, page) order
+    # Windows split from the same project window are next to each other
+    raw_issues = {}
+    for window, pages in zip(windows, window_pages):
+        if window[0] not in raw_issues:
+            raw_issues[window[0]] = []
+        for partial_result in pages:
+            raw_issues[window[0]].extend(partial_result["issues"])
 
-                # partial_result = _sonar_qube_single_api_call(
-                #     ISSUES_SEARCH,
-                #     {
-                #         "components": project_analysis.project,
-                #         "createdAfter": sonarqube_creation_date_min,
-                #         "createdBefore": sonarqube_creation_date_max,
-                #         "ps": PAGE_SIZE,
-                #         "p": current_page,
-                #         "languages": lang,
-                #         "resolutions": resol,
-                #         "types": types,
-                #     },
-                # )
-
-                for issue in partial_result["issues"]:
-                    new_issue = Issue(issue)
-                    _set_issue_lifetime(new_issue, analyses)
-                    result.append(new_issue)
-
-                # Is there another page?
-                issue_count = int(partial_result["total"])
-                more_pages = current_page * PAGE_SIZE < issue_count
+    result = []
+    for project in raw_issues:
+        result.extend(
+            _project_issues(raw_issues[project], project_analyses[project], keep_json)
+        )
+    # The crawl is complete, the next one fetches fresh issues
+    if checkpoint is not None:
+        checkpoint.clear()
     return result
 
 
@@ -535,47 +1476,126 @@ def api_measures_component(component, metricKeys):
         "metricKeys": param_list_to_strings(metricKeys),
     }
 
-    # We do not use _sonar_qube_api_call as it does not support different SonarQube servers
-    # logger.debug("API: " + SONAR_SERVER_SINGLE_URL + MEASURES_COMPONENT+"?"+str(parameters))
-    r = requests.get(
-        SONAR_SERVER_SINGLE_URL + MEASURES_COMPONENT,
-        auth=HTTPBasicAuth("admin", "Parola123456789!"),
-        params=parameters,
-    )
-    return r.json()
+    # Per-version measures are only kept on the SINGLE server
+    return _sonar_qube_single_api_call(MEASURES_COMPONENT, parameters)
 
 
-def api_cu_names(component):
-    COMPONENT_TREE = "/api/components/tree"
-    PAGE_SIZE = 500
-    cu_list = []
-
-    # Results have at least one page
-    current_page = 0
-    more_pages = True
-    while more_pages:
-        current_page += 1
-        parameters = {
-            "component": component,
-            "ps": PAGE_SIZE,
-            "p": current_page,
-            "qualifiers": "FIL",
+def api_measures_components(components, metricKeys, max_concurrency=1):
+    """
+    Retrieve measures of the given components with one @api_measures_component call each (on the SINGLE server)
+    For servers without /api/measures/component_tree, calls run concurrently since they are pure network waits
+    params:
+        components      - List of component keys (e.g. the file keys returned by @api_cu_names)
+        metricKeys      - List of metric keys (e.g. ["sqale_index", "ncloc"])
+        max_concurrency - Maximum number of API calls in flight
+    output:
+        Dictionary of (<component key>, {<metric key>: <value>}) entries, in the order of components, with the
+        same contents as @api_measures_component_tree; components that are not found have no measures
+    """
+    # This check is to avoid sending a string, which would then be split to chars
+    if not isinstance(metricKeys, list):
+        raise RuntimeError("Second parameter must be a Python list!")
+
+    def component_measures(component):
+        component_measure = api_measures_component(component, metricKeys)
+        if "errors" in component_measure:
+            error = SonarQubeError(
+                component + " - " + component_measure["errors"][0]["msg"]
+            )
+            # Only missing files (e.g. renamed in later versions) have no measures, other errors are raised
+            if not _is_not_found(error):
+                raise error
+            api_logger.debug("Component '%s' not found", component)
+            return {}
+        return {
+            measure["metric"]: measure["value"]
+            for measure in component_measure["component"]["measures"]
+            if "value" in measure
         }
 
-        # We do not use _sonar_qube_api_call as it does not support different SonarQube servers
-        # logger.debug("API: " + SONAR_SERVER_SINGLE_URL + MEASURES_COMPONENT+"?"+str(parameters))
-        r = requests.get(
-            SONAR_SERVER_SINGLE_URL + COMPONENT_TREE,
-            auth=HTTPBasicAuth("admin", "Parola123456789!"),
-            params=parameters,
+    if max_concurrency > 1:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            measures = list(executor.map(component_measures, components))
+    else:
+        measures = [component_measures(component) for component in components]
+    return dict(zip(components, measures))
+
+
+def api_cu_names(component, lazy=False):
+    """
+    Retrieve the files of a project version (on the SINGLE server)
+    params:
+        component - the project/component key (e.g. "jEdit.4.3")
+        lazy      - return a generator that fetches pages as file keys are consumed
+    output:
+        List of file keys
+    """
+    COMPONENT_TREE = "/api/components/tree"
+
+    # Per-version components are only kept on the SINGLE server
+    cu_keys = (
+        cu["key"]
+        for cu in _paginate(
+            _sonar_qube_single_api_call,
+            COMPONENT_TREE,
+            {"component": component, "qualifiers": "FIL"},
+            "components",
+            read_ahead=lazy,
         )
-        cu_dict = r.json()
+    )
+    return cu_keys if lazy else list(cu_keys)
+
 
-        for cu in cu_dict["components"]:
-            cu_list.append(cu["key"])
+def api_measures_component_tree(component, metricKeys, qualifiers="FIL", lazy=False):
+    """
+    Retrieve measures of all components under the given component, a page of up to 500 components per call
+    Corresponds to /api/measures/component_tree (on the SINGLE server)
+    params:
+        component  - the project/component key (e.g. "jEdit.4.3")
+        metricKeys - List of metric keys (e.g. ["sqale_index", "ncloc"])
+        qualifiers - Comma-separated component qualifiers to return (FIL = files)
+        lazy       - return a generator of (<component key>, {<metric key>: <value>}) tuples that fetches pages
+                     as components are consumed
+    output:
+        Dictionary of (<component key>, {<metric key>: <value>}) entries; components without a value
+        for a metric have no entry for it (empty if the component is not found)
+    """
+    # This check is to avoid sending a string, which would then be split to chars
+    if not isinstance(metricKeys, list):
+        raise RuntimeError("Second parameter must be a Python list!")
 
-        # Is there another page?
-        cu_count = int(cu_dict["paging"]["total"])
-        more_pages = current_page * PAGE_SIZE < cu_count
+    MEASURES_COMPONENT_TREE = "/api/measures/component_tree"
+    parameters = {
+        "component": component,
+        "metricKeys": param_list_to_strings(metricKeys),
+        "qualifiers": qualifiers,
+    }
 
-    return cu_list
+    def component_measures():
+        # Per-version measures are only kept on the SINGLE server
+        tree_components = _paginate(
+            _sonar_qube_single_api_call,
+            MEASURES_COMPONENT_TREE,
+            parameters,
+            "components",
+            read_ahead=lazy,
+        )
+        for tree_component in tree_components:
+            measures = {}
+            for measure in tree_component["measures"]:
+                if "value" in measure:
+                    measures[measure["metric"]] = measure["value"]
+            yield tree_component["key"], measures
+
+    if lazy:
+        return component_measures()
+
+    try:
+        return dict(component_measures())
+    except SonarQubeError as error:
+        # Other errors (authentication, permissions, parameters) must not pass for a version without files
+        if not _is_not_found(error):
+            raise
+        # e.g. the project version was not analysed on the SINGLE server
+        logger.warning("Component '%s' not found: %s", component, error)
+        return {}